@@ -0,0 +1,147 @@
+"""
+Raw page capture and offline replay
+
+While scraping, ``PageCapture`` stores the HTML of every search page it is
+given as a gzip file and records it in a JSON Lines manifest. ``reprocess``
+later runs the listing extractors over those stored pages in parallel, so new
+fields or fixed selectors can be backfilled across past runs without fetching
+anything again.
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import CAPTURE_FOLDER
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.jsonl"
+
+
+class PageCapture:
+    """Writes fetched pages of one run to a capture folder"""
+
+    def __init__(self, base_folder: str = CAPTURE_FOLDER, run_name: Optional[str] = None):
+        run_name = run_name or datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.folder = os.path.join(base_folder, run_name)
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        self._lock = threading.Lock()
+
+    def save(self, city: str, page: int, backend: str, url: str, html: str) -> str:
+        """Compress a page to disk and add it to the manifest; returns the file name"""
+        slug = re.sub(r"[^a-z0-9]+", "-", city.lower()).strip("-")
+        fetched_at = datetime.now()
+        filename = f"{slug}_p{page}_{backend}_{fetched_at.strftime('%H%M%S%f')}.html.gz"
+
+        with gzip.open(os.path.join(self.folder, filename), "wt", encoding="utf-8") as f:
+            f.write(html)
+
+        entry = {
+            "file": filename,
+            "city": city,
+            "page": page,
+            "backend": backend,
+            "url": url,
+            "fetched_at": fetched_at.isoformat(timespec="seconds"),
+        }
+        with self._lock:
+            with open(os.path.join(self.folder, MANIFEST_FILENAME), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return filename
+
+
+def load_manifest(folder: str) -> List[Dict]:
+    """Read the manifest entries of a capture folder"""
+    with open(os.path.join(folder, MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _reprocess_entry(folder: str, entry: Dict) -> List[Dict]:
+    """Extract listings from one captured page (runs in a worker process)"""
+    from scraper import extract_listings_from_html
+
+    with gzip.open(os.path.join(folder, entry["file"]), "rt", encoding="utf-8") as f:
+        html = f.read()
+    listings = extract_listings_from_html(html, entry["city"], entry["backend"])
+    for listing in listings:
+        listing["captured_at"] = entry["fetched_at"]
+        listing["capture_run"] = os.path.basename(os.path.normpath(folder))
+    return listings
+
+
+def reprocess(folders: List[str], workers: Optional[int] = None) -> List[Dict]:
+    """Re-extract listings from every page in the given capture folders in parallel"""
+    jobs = [(folder, entry) for folder in folders for entry in load_manifest(folder)]
+    if not jobs:
+        return []
+
+    listings = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_reprocess_entry, folder, entry) for folder, entry in jobs]
+        for (folder, entry), future in zip(jobs, futures):
+            try:
+                listings.extend(future.result())
+            except Exception as e:
+                logger.error(f"Error reprocessing {os.path.join(folder, entry['file'])}: {e}")
+    return listings
+
+
+def validate_runs(listings: List[Dict]) -> List[Dict]:
+    """Validate replayed listings one capture run at a time
+
+    The same room seen in two runs is a separate observation, not a duplicate.
+    """
+    from postprocess import validated_records
+
+    runs: Dict[str, List[Dict]] = {}
+    for listing in listings:
+        runs.setdefault(listing["capture_run"], []).append(listing)
+    data = []
+    for run_listings in runs.values():
+        data.extend(validated_records(run_listings)[0])
+    return data
+
+
+def main():
+    """Command line entry point for replaying captured runs"""
+    parser = argparse.ArgumentParser(description="Re-extract listings from captured pages")
+    parser.add_argument("folders", nargs="*",
+                        help=f"capture folders to replay (default: every run under {CAPTURE_FOLDER})")
+    parser.add_argument("--workers", type=int, default=None, help="parallel worker processes")
+    parser.add_argument("--format", choices=["csv", "excel", "both"], default="csv")
+    args = parser.parse_args()
+
+    from utils import save_to_csv, save_to_excel
+
+    folders = args.folders
+    if not folders and os.path.exists(CAPTURE_FOLDER):
+        folders = sorted(
+            os.path.join(CAPTURE_FOLDER, name) for name in os.listdir(CAPTURE_FOLDER)
+            if os.path.exists(os.path.join(CAPTURE_FOLDER, name, MANIFEST_FILENAME))
+        )
+
+    raw = reprocess(folders, args.workers)
+    if not raw:
+        print("No listings extracted")
+        return
+
+    data = validate_runs(raw)
+    print(f"Extracted {len(raw)} listings from {len(folders)} run(s); {len(data)} passed validation")
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if args.format in ["csv", "both"]:
+        save_to_csv(data, f"airbnb_listings_reprocessed_{timestamp}.csv")
+    if args.format in ["excel", "both"]:
+        save_to_excel(data, f"airbnb_listings_reprocessed_{timestamp}.xlsx")
+
+
+if __name__ == "__main__":
+    main()
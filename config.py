@@ -21,6 +21,7 @@ CITIES = [
 
 # Scraping settings
 LISTINGS_PER_CITY = 10
+SEARCH_PAGE_SIZE = 18  # listings Airbnb shows per search results page
 REQUEST_DELAY = 2  # seconds between requests
 TIMEOUT = 30  # request timeout in seconds
 
@@ -46,3 +47,58 @@ PROXY_LIST = [
 OUTPUT_FOLDER = "output"
 CSV_FILENAME = "airbnb_listings.csv"
 EXCEL_FILENAME = "airbnb_listings.xlsx"
+
+# Distributed job queue settings
+JOB_DB_PATH = "output/jobs.sqlite3"
+JOB_LEASE_SECONDS = 120  # a claimed task is requeued if not heartbeated within this window
+JOB_HEARTBEAT_INTERVAL = 30  # seconds between worker heartbeats
+JOB_MAX_ATTEMPTS = 3  # tasks failing this many times are marked as failed
+JOB_RETRY_DELAY_SECONDS = 60  # a failed task waits this long before it can be claimed again
+
+# Delta export settings
+DELTA_SNAPSHOT_FILENAME = "airbnb_snapshot.json"  # last known state of every listing, kept in OUTPUT_FOLDER
+DELTA_TRACKED_FIELDS = ["name", "price", "original_price", "location"]  # changes here count as updates
+
+# Post-processing / validation settings
+DROP_INVALID_LISTINGS = True  # drop rows flagged by validation before saving
+JUNK_NAME_PATTERNS = [
+    r"^search results",  # search page header picked up instead of a card title
+    r"over [\d,]+ places",
+    r"^n/a$",
+    r"^$",
+]
+CURRENCY_CODES = {"£": "GBP", "$": "USD", "€": "EUR"}
+
+# Resource limits for long runs
+MAX_DRIVER_PAGES = 50  # restart Chrome after this many pages
+MAX_DRIVER_RSS_MB = 1500  # restart Chrome once its processes use more memory than this
+MAX_PROCESS_RSS_MB = 1000  # spill results to disk early once Python itself grows past this
+RESULT_SPILL_THRESHOLD = 2000  # listings kept in memory before spilling to a segment file
+RESULT_SEGMENT_FOLDER = "output/segments"
+MAX_LOG_LINES = 1000  # lines kept in the GUI progress log
+
+# Page capture / replay settings
+CAPTURE_PAGES = False  # save raw search pages so they can be re-extracted later
+CAPTURE_FOLDER = "output/captures"
+
+# City scheduling settings
+SCHEDULE_STATE_FILENAME = "city_schedule.json"  # per-city history, kept in OUTPUT_FOLDER
+CITY_FRESHNESS_SLA_HOURS = 24  # a city is due once its data is older than this
+CITY_SLA_OVERRIDES = {
+    # "New York, NY": 6,
+}
+VOLATILITY_WEIGHT = 4  # how strongly price volatility shortens a city's SLA
+DEFAULT_CITY_COST_SECONDS = 60  # assumed scrape time for cities without history
+RUN_TIME_BUDGET_SECONDS = None  # stop queueing cities once their expected cost exceeds this
+
+# Failure handling settings
+BREAKER_FAILURE_THRESHOLD = 3  # consecutive failures before a backend, proxy or city is skipped
+BREAKER_COOLDOWN_SECONDS = 300  # how long a tripped breaker skips work before trying again
+DEAD_LETTER_FILENAME = "dead_letters.json"  # failed city/page tasks, kept in OUTPUT_FOLDER
+BLOCK_MARKERS = [
+    "captcha",
+    "are you a human",
+    "access denied",
+    "unusual traffic",
+    "request blocked",
+]
@@ -0,0 +1,139 @@
+"""
+Delta exports: write only the listings that changed since the previous run
+
+Each listing is keyed by its Airbnb room ID and fingerprinted with a hash of
+the tracked fields. The current run is compared against the last snapshot and
+only inserts, updates and disappearances are written, together with a small
+JSON manifest describing the export. The snapshot is then advanced so the next
+run diffs against this one.
+
+A listing only counts as removed when the page it was last seen on was
+scraped successfully in this run. Pages that failed, or were not part of the
+run, leave their listings untouched. A listing that merely drops out of the
+top ``LISTINGS_PER_CITY`` results of its page is still reported as removed,
+and comes back as an insert once it ranks high enough again; this rank churn
+is inherent to scraping only the first results of each page.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config import OUTPUT_FOLDER, DELTA_SNAPSHOT_FILENAME, DELTA_TRACKED_FIELDS
+from utils import create_output_folder, extract_room_id, save_to_csv, save_to_excel, write_json_atomic
+
+
+def listing_room_id(listing: Dict) -> Optional[str]:
+    """Room ID of a listing, using the column added by post-processing when present"""
+    room_id = listing.get("room_id")
+    if room_id:
+        return str(room_id)
+    return extract_room_id(listing.get("url"))
+
+
+def listing_hash(listing: Dict) -> str:
+    """Fingerprint the tracked fields of a listing"""
+    payload = "\x1f".join(str(listing.get(field, "N/A")) for field in DELTA_TRACKED_FIELDS)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def load_snapshot(path: str) -> Dict:
+    """Load the previous snapshot, or an empty one on the first run"""
+    if not os.path.exists(path):
+        return {"timestamp": None, "listings": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_snapshot(snapshot: Dict, path: str):
+    """Write the snapshot atomically so a crash never leaves a half-written file"""
+    write_json_atomic(path, snapshot)
+
+
+def listing_page(listing: Dict) -> Tuple[str, int]:
+    """The (city, page) search page a listing was scraped from"""
+    return listing.get("city"), int(listing.get("page") or 0)
+
+
+def compute_delta(data: List[Dict], previous: Dict[str, Dict],
+                  succeeded: Set[Tuple[str, int]]) -> Dict[str, List[Dict]]:
+    """Split the current listings into inserts, updates and deletes against a snapshot
+
+    Only listings last seen on a (city, page) in ``succeeded`` are checked for
+    disappearances, so failed or skipped pages never report removals.
+    """
+    current = {}
+    for listing in data:
+        room_id = listing_room_id(listing)
+        if room_id:
+            current[room_id] = listing
+
+    changes = {"insert": [], "update": [], "delete": []}
+    for room_id, listing in current.items():
+        entry = previous.get(room_id)
+        if entry is None:
+            changes["insert"].append(listing)
+        elif entry["hash"] != listing_hash(listing):
+            changes["update"].append(listing)
+
+    for room_id, entry in previous.items():
+        if room_id not in current and listing_page(entry["row"]) in succeeded:
+            changes["delete"].append(entry["row"])
+
+    return changes
+
+
+def write_delta_export(data: List[Dict], output_format: str = "csv", timestamp: Optional[str] = None,
+                       succeeded: Optional[Iterable[Tuple[str, int]]] = None) -> Dict:
+    """Write the changes since the last snapshot and return the export manifest
+
+    ``succeeded`` lists the (city, page) pages scraped without failure in this
+    run; it defaults to the pages that produced at least one listing.
+    """
+    create_output_folder()
+    timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+    snapshot_path = os.path.join(OUTPUT_FOLDER, DELTA_SNAPSHOT_FILENAME)
+
+    snapshot = load_snapshot(snapshot_path)
+    previous = snapshot["listings"]
+    succeeded = set(succeeded) if succeeded is not None else {listing_page(listing) for listing in data}
+    changes = compute_delta(data, previous, succeeded)
+
+    rows = []
+    for change, listings in changes.items():
+        for listing in listings:
+            rows.append({"change": change, "room_id": listing_room_id(listing), **listing})
+
+    files = []
+    if rows:
+        if output_format in ["csv", "both"]:
+            files.append(f"airbnb_delta_{timestamp}.csv")
+            save_to_csv(rows, files[-1])
+        if output_format in ["excel", "both"]:
+            files.append(f"airbnb_delta_{timestamp}.xlsx")
+            save_to_excel(rows, files[-1])
+
+    for listing in changes["insert"] + changes["update"]:
+        previous[listing_room_id(listing)] = {"hash": listing_hash(listing), "row": listing}
+    for listing in changes["delete"]:
+        previous.pop(listing_room_id(listing), None)
+
+    keyed = {room_id for room_id in map(listing_room_id, data) if room_id}
+    manifest = {
+        "timestamp": timestamp,
+        "previous_snapshot": snapshot["timestamp"],
+        "tracked_fields": DELTA_TRACKED_FIELDS,
+        "scraped": len(data),
+        "inserted": len(changes["insert"]),
+        "updated": len(changes["update"]),
+        "deleted": len(changes["delete"]),
+        "unchanged": len(keyed) - len(changes["insert"]) - len(changes["update"]),
+        "files": files,
+    }
+    with open(os.path.join(OUTPUT_FOLDER, f"airbnb_delta_{timestamp}.manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    save_snapshot({"timestamp": timestamp, "listings": previous}, snapshot_path)
+    return manifest
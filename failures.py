@@ -0,0 +1,221 @@
+"""
+Failure classification, circuit breakers and dead-letter tracking
+
+Scrape errors are sorted into a few kinds (timeout, block/captcha, selector
+miss, driver crash, network) so callers can react to each one differently.
+Circuit breakers stop sending work to a backend, proxy or city that keeps
+failing, so a blocked IP or dead browser costs seconds instead of a full
+page-load timeout for every remaining city. Tasks that fail go to a
+dead-letter list from which they can be retried later.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from requests import exceptions as requests_errors
+from selenium.common import exceptions as selenium_errors
+from urllib3 import exceptions as urllib3_errors
+
+from config import (
+    BLOCK_MARKERS,
+    BREAKER_COOLDOWN_SECONDS,
+    BREAKER_FAILURE_THRESHOLD,
+    DEAD_LETTER_FILENAME,
+    OUTPUT_FOLDER,
+)
+from utils import write_json_atomic
+
+# Failure kinds
+TIMEOUT = "timeout"
+BLOCKED = "blocked"
+SELECTOR_MISS = "selector_miss"
+DRIVER_CRASH = "driver_crash"
+NETWORK = "network"
+CIRCUIT_OPEN = "circuit_open"
+UNKNOWN = "unknown"
+
+# Failure kinds that say something about a whole backend or proxy rather than
+# one city; the city's own breaker counts every kind
+BACKEND_FAILURE_KINDS = {BLOCKED, DRIVER_CRASH}
+PROXY_FAILURE_KINDS = {BLOCKED, NETWORK}
+
+# Substrings of generic WebDriver errors raised once the browser or chromedriver is gone
+DRIVER_CRASH_MARKERS = [
+    "chrome not reachable",
+    "disconnected",
+    "session deleted",
+    "target window already closed",
+]
+
+# Errors from the WebDriver session itself, or from talking to a chromedriver that is gone
+DRIVER_CRASH_ERRORS = (
+    selenium_errors.InvalidSessionIdException,
+    selenium_errors.NoSuchWindowException,
+    urllib3_errors.MaxRetryError,
+    urllib3_errors.NewConnectionError,
+    urllib3_errors.ProtocolError,
+    ConnectionRefusedError,
+)
+
+
+class ScrapeFailure(Exception):
+    """A classified scraping failure
+
+    For ``CIRCUIT_OPEN``, ``breaker_key`` names the open breaker and
+    ``retry_after`` is the wait in seconds before it lets a trial through.
+    """
+
+    def __init__(self, kind: str, message: str, retry_after: Optional[float] = None,
+                 breaker_key: Optional[str] = None):
+        super().__init__(message)
+        self.kind = kind
+        self.retry_after = retry_after
+        self.breaker_key = breaker_key
+
+
+def counts_against(key: str, kind: str) -> bool:
+    """True if a failure of this kind should count toward the breaker with this key"""
+    if key.startswith("city:"):
+        return True
+    if key.startswith("proxy:"):
+        return kind in PROXY_FAILURE_KINDS
+    return kind in BACKEND_FAILURE_KINDS
+
+
+def looks_blocked(page_text: Optional[str]) -> bool:
+    """True if a page looks like a captcha or block page"""
+    if not page_text:
+        return False
+    lowered = page_text.lower()
+    return any(marker in lowered for marker in BLOCK_MARKERS)
+
+
+def classify_failure(exc: Exception, page_text: Optional[str] = None) -> str:
+    """Map an exception (and the page it happened on, if known) to a failure kind"""
+    if isinstance(exc, ScrapeFailure):
+        return exc.kind
+    if looks_blocked(page_text):
+        return BLOCKED
+
+    # Subclasses are checked before their bases: TimeoutException is a
+    # WebDriverException and requests' ConnectTimeout is also a ConnectionError
+    if isinstance(exc, requests_errors.HTTPError):
+        status = getattr(exc.response, "status_code", None)
+        return BLOCKED if status in (403, 429) else NETWORK
+    if isinstance(exc, (requests_errors.Timeout, selenium_errors.TimeoutException)):
+        return TIMEOUT
+    if isinstance(exc, (selenium_errors.NoSuchElementException,
+                        selenium_errors.StaleElementReferenceException)):
+        return SELECTOR_MISS
+    if isinstance(exc, DRIVER_CRASH_ERRORS):
+        return DRIVER_CRASH
+    if isinstance(exc, (requests_errors.ConnectionError, requests_errors.ChunkedEncodingError)):
+        return NETWORK
+    if isinstance(exc, selenium_errors.WebDriverException):
+        message = str(exc).lower()
+        if any(marker in message for marker in DRIVER_CRASH_MARKERS):
+            return DRIVER_CRASH
+    return UNKNOWN
+
+
+class CircuitBreaker:
+    """Opens after repeated failures and lets one trial through after a cooldown"""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 cooldown: float = BREAKER_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_kind: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.time() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets a trial through (0 if it already would)"""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - time.time())
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_kind = None
+
+    def record_failure(self, kind: str):
+        self.consecutive_failures += 1
+        self.last_kind = kind
+        # A failed half-open trial re-opens the breaker for another cooldown
+        if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.time()
+
+
+class BreakerBoard:
+    """Circuit breakers keyed by backend, proxy or city name"""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 cooldown: float = BREAKER_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, key: str) -> CircuitBreaker:
+        if key not in self.breakers:
+            self.breakers[key] = CircuitBreaker(self.failure_threshold, self.cooldown)
+        return self.breakers[key]
+
+    def allow(self, key: str) -> bool:
+        return self.get(key).allow()
+
+    def open_keys(self, prefix: str = "") -> List[str]:
+        """Keys whose breaker is currently refusing work"""
+        return [key for key, breaker in self.breakers.items()
+                if key.startswith(prefix) and not breaker.allow()]
+
+
+class DeadLetterQueue:
+    """Failed city/page tasks persisted to disk for a later retry"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(OUTPUT_FOLDER, DEAD_LETTER_FILENAME)
+
+    def load(self) -> List[Dict]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write(self, entries: List[Dict]):
+        write_json_atomic(self.path, entries, indent=2)
+
+    def add(self, city: str, page: int, kind: str, backend: str, error: str):
+        """Record a failed task, replacing any earlier entry for the same city/page"""
+        entries = [entry for entry in self.load() if (entry["city"], entry["page"]) != (city, page)]
+        entries.append({
+            "city": city,
+            "page": page,
+            "kind": kind,
+            "backend": backend,
+            "error": error,
+            "failed_at": datetime.now().isoformat(timespec="seconds"),
+        })
+        self._write(entries)
+
+    def remove(self, city: str, page: int):
+        """Drop the entry for a city/page once it has been scraped successfully"""
+        entries = self.load()
+        remaining = [entry for entry in entries if (entry["city"], entry["page"]) != (city, page)]
+        if len(remaining) != len(entries):
+            self._write(remaining)
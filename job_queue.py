@@ -0,0 +1,467 @@
+"""
+Shared job queue for splitting one scrape run across several workers
+
+The coordinator enqueues one task per (city, page). Any number of worker
+processes or containers on one host, sharing the SQLite file, claim tasks under a lease,
+heartbeat while scraping, and store their results back in the database.
+Leases that are not renewed in time are requeued so a crashed worker does not
+lose its tasks. The merged results of all workers form the run's output.
+
+SQLite runs in WAL mode so readers never block the single writer. WAL needs
+shared memory between the processes, so keep the database on a local or
+bind-mounted volume of one host, never on a network filesystem.
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config import (
+    CITIES,
+    JOB_DB_PATH,
+    JOB_HEARTBEAT_INTERVAL,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_DELAY_SECONDS,
+    RUN_TIME_BUDGET_SECONDS,
+)
+from failures import CIRCUIT_OPEN
+from utils import add_delay
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    city TEXT NOT NULL,
+    page INTEGER NOT NULL DEFAULT 0,
+    priority REAL NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result TEXT,
+    claimed_at REAL,
+    duration REAL,
+    completed_at REAL,
+    recorded INTEGER NOT NULL DEFAULT 0,
+    available_at REAL,
+    updated_at REAL NOT NULL,
+    UNIQUE (city, page)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_claim ON tasks (status, priority DESC, id);
+"""
+
+# Columns added after the first release, created on databases that predate them
+MIGRATED_COLUMNS = {
+    "completed_at": "REAL",
+    "recorded": "INTEGER NOT NULL DEFAULT 0",
+    "available_at": "REAL",
+}
+
+
+def make_worker_id() -> str:
+    """Build a worker id that is unique across hosts and processes"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class JobQueue:
+    def __init__(self, db_path: str = JOB_DB_PATH, lease_seconds: float = JOB_LEASE_SECONDS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS, retry_delay: float = JOB_RETRY_DELAY_SECONDS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        folder = os.path.dirname(db_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}
+            for column, definition in MIGRATED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {definition}")
+
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection so the queue can be used from any thread"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, cities: Iterable[str], pages: int = 1, priority: float = 0) -> int:
+        """Add a task for every city/page pair; already queued pairs are left alone"""
+        now = time.time()
+        rows = [(city, page, priority, now) for city in cities for page in range(pages)]
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (city, page, priority, updated_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            return conn.total_changes - before
+
+    def requeue_expired(self) -> int:
+        """Return tasks whose lease ran out to the pending state"""
+        with self._connect() as conn:
+            return self._requeue_expired(conn, time.time())
+
+    def _requeue_expired(self, conn: sqlite3.Connection, now: float) -> int:
+        cursor = conn.execute(
+            "UPDATE tasks SET status = 'pending', worker_id = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE status = 'running' AND lease_expires < ?",
+            (now, now),
+        )
+        if cursor.rowcount:
+            logger.warning(f"Requeued {cursor.rowcount} task(s) with expired leases")
+        return cursor.rowcount
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """Lease the highest priority pending task that is not waiting for a retry, or return None"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._requeue_expired(conn, now)
+                row = conn.execute(
+                    "SELECT id, city, page, attempts FROM tasks "
+                    "WHERE status = 'pending' AND (available_at IS NULL OR available_at <= ?) "
+                    "ORDER BY priority DESC, id LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE tasks SET status = 'running', worker_id = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, claimed_at = ?, updated_at = ? WHERE id = ?",
+                    (worker_id, now + self.lease_seconds, now, now, row["id"]),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return {"id": row["id"], "city": row["city"], "page": row["page"], "attempts": row["attempts"] + 1}
+
+    def heartbeat(self, task_id: int, worker_id: str) -> bool:
+        """Extend a lease; returns False if the worker no longer holds the task"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now + self.lease_seconds, now, task_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, task_id: int, worker_id: str, listings: List[Dict]) -> bool:
+        """Store a task's results; ignored if the lease was lost to another worker"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = 'done', result = ?, error = NULL, lease_expires = NULL, "
+                "duration = ? - claimed_at, completed_at = ?, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (json.dumps(listings, ensure_ascii=False), now, now, now, task_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, task_id: int, worker_id: str, error: str) -> None:
+        """Retry a failed task after ``retry_delay``, or mark it failed after too many attempts
+
+        The delay lets other pending work go first instead of the same worker
+        claiming the failing task again straight away.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "completed_at = CASE WHEN attempts >= ? THEN ? ELSE NULL END, available_at = ?, "
+                "worker_id = NULL, lease_expires = NULL, error = ?, duration = ? - claimed_at, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (self.max_attempts, self.max_attempts, now, now + self.retry_delay, error, now, now,
+                 task_id, worker_id),
+            )
+
+    def release(self, task_id: int, worker_id: str, delay: float = 0) -> None:
+        """Hand a task back untouched, without counting the attempt against it
+
+        With a ``delay`` the task is not claimed again before that many seconds.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = 'pending', worker_id = NULL, lease_expires = NULL, "
+                "attempts = attempts - 1, available_at = ?, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now + delay, now, task_id, worker_id),
+            )
+
+    def counts(self) -> Dict[str, int]:
+        """Number of tasks in each state"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def is_finished(self) -> bool:
+        """True once no task is pending or running"""
+        counts = self.counts()
+        return not counts.get("pending") and not counts.get("running")
+
+    def merged_results(self) -> List[Dict]:
+        """Combine the results of all finished tasks, dropping listings seen twice"""
+        merged = []
+        seen_urls = set()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT page, result FROM tasks WHERE status = 'done' ORDER BY id"
+            ).fetchall()
+        for row in rows:
+            for listing in json.loads(row["result"] or "[]"):
+                listing.setdefault("page", row["page"])
+                url = listing.get("url", "N/A")
+                if url != "N/A":
+                    if url in seen_urls:
+                        continue
+                    seen_urls.add(url)
+                merged.append(listing)
+        return merged
+
+    def succeeded_pages(self) -> Set[Tuple[str, int]]:
+        """(city, page) pairs whose task finished successfully"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT city, page FROM tasks WHERE status = 'done'").fetchall()
+        return {(row["city"], row["page"]) for row in rows}
+
+    def city_results(self) -> Dict[str, Dict]:
+        """Listings, total scrape time, completion time and whether any page succeeded per city,
+        over finished or failed tasks not yet recorded in the schedule history (see mark_recorded)"""
+        cities: Dict[str, Dict] = {}
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, city, status, result, duration, completed_at FROM tasks "
+                "WHERE status IN ('done', 'failed') AND recorded = 0 ORDER BY id"
+            ).fetchall()
+        for row in rows:
+            entry = cities.setdefault(row["city"], {"listings": [], "duration": 0.0, "succeeded": False,
+                                                    "completed_at": None, "task_ids": []})
+            entry["succeeded"] = entry["succeeded"] or row["status"] == "done"
+            entry["listings"].extend(json.loads(row["result"] or "[]"))
+            entry["duration"] += row["duration"] or 0.0
+            if row["completed_at"] is not None:
+                entry["completed_at"] = max(entry["completed_at"] or 0.0, row["completed_at"])
+            entry["task_ids"].append(row["id"])
+        return cities
+
+    def mark_recorded(self, task_ids: Iterable[int]) -> None:
+        """Flag tasks as recorded so a later merge does not count them again"""
+        with self._connect() as conn:
+            conn.executemany("UPDATE tasks SET recorded = 1 WHERE id = ?", [(task_id,) for task_id in task_ids])
+
+    def reset(self) -> None:
+        """Drop every task, e.g. before starting a fresh run"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM tasks")
+
+
+class _Heartbeat(threading.Thread):
+    """Background thread that keeps a task's lease alive while it is scraped"""
+
+    def __init__(self, queue: JobQueue, task_id: int, worker_id: str, interval: float):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self.lost = False
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            if not self.queue.heartbeat(self.task_id, self.worker_id):
+                logger.warning(f"Lost lease on task {self.task_id}")
+                self.lost = True
+                return
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_worker(queue: JobQueue, scraper, worker_id: Optional[str] = None, callback=None,
+               stop_event: Optional[threading.Event] = None,
+               heartbeat_interval: float = JOB_HEARTBEAT_INTERVAL, governor=None) -> int:
+    """Claim and scrape tasks until the queue is drained; returns the number completed"""
+    worker_id = worker_id or make_worker_id()
+    completed = 0
+
+    while not (stop_event and stop_event.is_set()):
+        task = queue.claim(worker_id)
+        if task is None:
+            if queue.is_finished():
+                break
+            # Other workers still hold leases; wait in case one of them expires
+            time.sleep(heartbeat_interval)
+            continue
+
+        if callback:
+            callback(f"[{worker_id}] Task {task['id']}: {task['city']} page {task['page'] + 1}")
+
+        heartbeat = _Heartbeat(queue, task["id"], worker_id, heartbeat_interval)
+        heartbeat.start()
+        # scrape_city_listings never raises; failures are reported through last_failure
+        listings = scraper.scrape_city_listings(task["city"], callback, page=task["page"])
+        heartbeat.stop()
+
+        failure = scraper.last_failure
+        if heartbeat.lost:
+            # Another worker owns the task now; don't write anything back for it
+            logger.warning(f"Dropping task {task['id']}; its lease expired while scraping")
+        elif failure is not None and failure.kind == CIRCUIT_OPEN:
+            wait = failure.retry_after if failure.retry_after is not None else heartbeat_interval
+            if (failure.breaker_key or "").startswith("city:"):
+                # Only this city is backing off; park its task and move on to other cities
+                queue.release(task["id"], worker_id, delay=wait)
+                continue
+            # The whole backend is backing off; leave the task for another worker
+            # and wait until the breaker lets a trial through
+            queue.release(task["id"], worker_id)
+            if callback:
+                callback(f"[{worker_id}] {failure}; waiting {wait:.0f}s")
+            if stop_event:
+                stop_event.wait(wait)
+            else:
+                time.sleep(wait)
+            continue
+        elif failure is not None:
+            queue.fail(task["id"], worker_id, f"{failure.kind}: {failure}")
+        elif queue.complete(task["id"], worker_id, listings):
+            completed += 1
+        else:
+            logger.warning(f"Discarding results for task {task['id']}; lease was reassigned")
+
+        # Failed pages still hit the site and the browser, so they count too
+        if governor:
+            governor.after_page(scraper, callback=callback)
+
+        add_delay()
+
+    return completed
+
+
+def main():
+    """Command line entry point for the coordinator and worker roles"""
+    parser = argparse.ArgumentParser(description="Distributed Airbnb scraping queue")
+    parser.add_argument("--db", default=JOB_DB_PATH, help="path to the shared SQLite job database")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = sub.add_parser("enqueue", help="queue city/page tasks")
+    enqueue_parser.add_argument("cities", nargs="*", help="cities to queue (default: all configured)")
+    enqueue_parser.add_argument("--pages", type=int, default=1, help="result pages per city")
+    enqueue_parser.add_argument("--reset", action="store_true", help="clear existing tasks first")
+    enqueue_parser.add_argument("--schedule", action="store_true",
+                                help="queue only stale cities, most urgent first")
+
+    worker_parser = sub.add_parser("worker", help="claim and scrape tasks until the queue is empty")
+    worker_parser.add_argument("--no-selenium", action="store_true", help="scrape with requests only")
+    worker_parser.add_argument("--capture", action="store_true", help="save raw pages for later replay")
+
+    merge_parser = sub.add_parser("merge", help="write the merged results of all workers")
+    merge_parser.add_argument("--format", choices=["csv", "excel", "both"], default="both")
+    merge_parser.add_argument("--delta", action="store_true", help="write only changes since the last run")
+
+    sub.add_parser("status", help="show task counts")
+
+    args = parser.parse_args()
+    queue = JobQueue(args.db)
+
+    if args.command == "enqueue":
+        if args.reset:
+            queue.reset()
+        cities = args.cities or CITIES
+        if args.schedule:
+            from scheduler import CityScheduler
+
+            ordered = CityScheduler().build_queue(cities, RUN_TIME_BUDGET_SECONDS)
+            added = sum(
+                queue.enqueue([city], pages=args.pages, priority=len(ordered) - rank)
+                for rank, city in enumerate(ordered)
+            )
+        else:
+            added = queue.enqueue(cities, pages=args.pages)
+        print(f"Queued {added} task(s)")
+
+    elif args.command == "worker":
+        from capture import PageCapture
+        from resource_governor import ResourceGovernor
+        from scraper import AirbnbScraper
+
+        worker_id = make_worker_id()
+        capture = PageCapture(run_name=worker_id) if args.capture else None
+        scraper = AirbnbScraper(use_selenium=not args.no_selenium, capture=capture)
+        try:
+            completed = run_worker(queue, scraper, worker_id, callback=print, governor=ResourceGovernor())
+        finally:
+            scraper.close()
+        print(f"Worker finished after completing {completed} task(s)")
+
+    elif args.command == "merge":
+        from postprocess import validated_records
+        from utils import save_to_csv, save_to_excel
+
+        from scheduler import CityScheduler
+
+        # Record each task once, dated when it finished rather than when merge runs
+        scheduler = CityScheduler()
+        recorded_ids = []
+        for city, result in queue.city_results().items():
+            scheduler.record(city, result["listings"], result["duration"], result["succeeded"],
+                             now=result["completed_at"])
+            recorded_ids.extend(result["task_ids"])
+        scheduler.save()
+        queue.mark_recorded(recorded_ids)
+
+        merged = queue.merged_results()
+        if not merged:
+            print("No results to merge")
+            return
+
+        data, stats = validated_records(merged)
+        print(f"Validation: {len(data)} of {len(merged)} listings passed")
+        print(stats.to_string(index=False))
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if args.delta:
+            from delta_export import write_delta_export
+
+            manifest = write_delta_export(data, args.format, timestamp, queue.succeeded_pages())
+            print(f"Delta export: {manifest['inserted']} new, {manifest['updated']} updated, "
+                  f"{manifest['deleted']} removed")
+            return
+        if args.format in ["csv", "both"]:
+            save_to_csv(data, f"airbnb_listings_{timestamp}.csv")
+        if args.format in ["excel", "both"]:
+            save_to_excel(data, f"airbnb_listings_{timestamp}.xlsx")
+
+    elif args.command == "status":
+        for status, count in sorted(queue.counts().items()):
+            print(f"{status}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,12 +6,19 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import threading
 import os
+import shutil
+import time
 from datetime import datetime
-import pandas as pd
 
 from scraper import AirbnbScraper
-from config import CITIES, CSV_FILENAME, EXCEL_FILENAME
-from utils import save_to_csv, save_to_excel, create_output_folder
+from config import CITIES, CSV_FILENAME, EXCEL_FILENAME, MAX_LOG_LINES, CAPTURE_PAGES, RUN_TIME_BUDGET_SECONDS
+from utils import ListingWriter, create_output_folder
+from delta_export import write_delta_export
+from postprocess import combine_city_stats, validated_records
+from resource_governor import ResourceGovernor, ResultBuffer
+from capture import PageCapture
+from scheduler import CityScheduler
+from failures import DeadLetterQueue, CIRCUIT_OPEN
 
 class AirbnbScraperGUI:
     def __init__(self, root):
@@ -22,7 +29,10 @@ class AirbnbScraperGUI:
         
         self.scraper = None
         self.is_scraping = False
-        self.scraped_data = []
+        self.scraped_data = ResultBuffer()
+        self.dead_letters = DeadLetterQueue()
+        self.succeeded_pages = set()  # (city, page) scraped without failure this run
+        self.saved_files = {}  # output format -> file written by the last auto-save
         
         self.create_widgets()
         self.center_window()
@@ -109,6 +119,24 @@ class AirbnbScraperGUI:
         ttk.Radiobutton(format_frame, text="Both", variable=self.output_format_var, 
                        value="both").pack(side=tk.LEFT, padx=5)
         
+        # Delta export option
+        self.delta_export_var = tk.BooleanVar(value=False)
+        delta_check = ttk.Checkbutton(options_frame, text="Delta export (only changes since last run)", 
+                                     variable=self.delta_export_var)
+        delta_check.grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # Page capture option
+        self.capture_pages_var = tk.BooleanVar(value=CAPTURE_PAGES)
+        capture_check = ttk.Checkbutton(options_frame, text="Save raw pages for replay", 
+                                       variable=self.capture_pages_var)
+        capture_check.grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # Scheduling option
+        self.schedule_var = tk.BooleanVar(value=False)
+        schedule_check = ttk.Checkbutton(options_frame, text="Only stale cities, most urgent first", 
+                                        variable=self.schedule_var)
+        schedule_check.grid(row=4, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
         # Log area
         log_frame = ttk.LabelFrame(main_frame, text="Progress Log", padding="5")
         log_frame.grid(row=4, column=0, columnspan=3, sticky=tk.W+tk.E+tk.N+tk.S, pady=10)
@@ -134,6 +162,10 @@ class AirbnbScraperGUI:
                                     command=self.export_data, state=tk.DISABLED)
         self.export_btn.pack(side=tk.LEFT, padx=5)
         
+        self.retry_btn = ttk.Button(control_frame, text="Retry Failed", command=self.retry_failed,
+                                   state=tk.NORMAL if self.dead_letters.load() else tk.DISABLED)
+        self.retry_btn.pack(side=tk.LEFT, padx=5)
+        
         self.clear_log_btn = ttk.Button(control_frame, text="Clear Log", command=self.clear_log)
         self.clear_log_btn.pack(side=tk.LEFT, padx=5)
         
@@ -156,6 +188,10 @@ class AirbnbScraperGUI:
         self.log_text.config(state=tk.NORMAL)
         timestamp = datetime.now().strftime("%H:%M:%S")
         self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
+        # Keep the log bounded so long runs don't grow the widget forever
+        line_count = int(self.log_text.index("end-1c").split(".")[0])
+        if line_count > MAX_LOG_LINES:
+            self.log_text.delete("1.0", f"{line_count - MAX_LOG_LINES + 1}.0")
         self.log_text.see(tk.END)
         self.log_text.config(state=tk.DISABLED)
         self.root.update_idletasks()
@@ -179,14 +215,36 @@ class AirbnbScraperGUI:
             return
         
         selected_cities = [CITIES[i] for i in selected_indices]
+        self.begin_scraping(selected_cities)
+    
+    def retry_failed(self):
+        """Scrape the cities that failed in earlier runs again
+
+        Entries stay on the dead-letter list until their city is scraped
+        successfully, so stopping a retry part way loses nothing.
+        """
+        entries = self.dead_letters.load()
+        if not entries:
+            messagebox.showinfo("Nothing to Retry", "There are no failed cities to retry.")
+            self.retry_btn.config(state=tk.DISABLED)
+            return
         
+        cities = list(dict.fromkeys(entry["city"] for entry in entries))
+        self.log_message(f"Retrying {len(cities)} failed cities")
+        self.begin_scraping(cities)
+    
+    def begin_scraping(self, selected_cities):
+        """Reset state and start scraping the given cities in a background thread"""
         self.is_scraping = True
-        self.scraped_data = []
+        self.scraped_data.clear()
+        self.succeeded_pages = set()
+        self.saved_files = {}
         
         # Update UI state
         self.start_btn.config(state=tk.DISABLED)
         self.stop_btn.config(state=tk.NORMAL)
         self.export_btn.config(state=tk.DISABLED)
+        self.retry_btn.config(state=tk.DISABLED)
         
         self.log_message(f"Starting to scrape {len(selected_cities)} cities...")
         self.update_progress(0)
@@ -200,7 +258,19 @@ class AirbnbScraperGUI:
         """Worker function for scraping (runs in separate thread)"""
         try:
             # Initialize scraper
-            self.scraper = AirbnbScraper(use_selenium=self.use_selenium_var.get())
+            capture = PageCapture() if self.capture_pages_var.get() else None
+            self.scraper = AirbnbScraper(use_selenium=self.use_selenium_var.get(), capture=capture,
+                                         dead_letters=self.dead_letters)
+            if capture:
+                self.log_message(f"Saving raw pages to {capture.folder}")
+            governor = ResourceGovernor()
+            scheduler = CityScheduler()
+            
+            if self.schedule_var.get():
+                queue = scheduler.build_queue(cities, RUN_TIME_BUDGET_SECONDS)
+                self.log_message(f"Scheduled {len(queue)} of {len(cities)} cities; "
+                                 f"{len(cities) - len(queue)} are still fresh or over budget")
+                cities = queue
             
             total_cities = len(cities)
             
@@ -210,15 +280,29 @@ class AirbnbScraperGUI:
                 
                 self.log_message(f"Scraping city {i+1}/{total_cities}: {city}")
                 
+                started = time.time()
+                city_listings = []
+                succeeded = False
                 try:
                     city_listings = self.scraper.scrape_city_listings(city, self.log_message)
                     self.scraped_data.extend(city_listings)
                     
-                    self.log_message(f"Found {len(city_listings)} listings for {city}")
+                    if self.scraper.last_failure is None:
+                        succeeded = True
+                        self.succeeded_pages.add((city, 0))
+                        self.log_message(f"Found {len(city_listings)} listings for {city}")
                     
                 except Exception as e:
                     self.log_message(f"Error scraping {city}: {str(e)}")
                 
+                # Cities skipped by an open circuit say nothing about the city itself
+                failure = self.scraper.last_failure
+                if failure is None or failure.kind != CIRCUIT_OPEN:
+                    scheduler.record(city, city_listings, time.time() - started, succeeded)
+                    scheduler.save()
+                
+                governor.after_page(self.scraper, self.scraped_data, self.log_message)
+                
                 # Update progress
                 progress = ((i + 1) / total_cities) * 100
                 self.update_progress(progress)
@@ -237,7 +321,9 @@ class AirbnbScraperGUI:
         
         finally:
             # Clean up
-            # No close() method for AirbnbScraper
+            if self.scraper:
+                self.scraper.close()
+                self.scraper = None
             
             # Update UI state
             self.root.after(0, self.scraping_finished)
@@ -248,14 +334,31 @@ class AirbnbScraperGUI:
         self.start_btn.config(state=tk.NORMAL)
         self.stop_btn.config(state=tk.DISABLED)
         
-        if self.scraped_data:
+        if self.scraped_data or self.saved_files:
             self.export_btn.config(state=tk.NORMAL)
+        
+        failed = self.dead_letters.load()
+        if failed:
+            kinds = {}
+            for entry in failed:
+                kinds[entry["kind"]] = kinds.get(entry["kind"], 0) + 1
+            summary = ", ".join(f"{count} {kind}" for kind, count in sorted(kinds.items()))
+            self.log_message(f"{len(failed)} cities failed ({summary}); use Retry Failed to try them again")
+            self.retry_btn.config(state=tk.NORMAL)
     
     def stop_scraping(self):
         """Stop the scraping process"""
         self.is_scraping = False
         self.log_message("Stopping scraping...")
     
+    def validated_chunks(self, stats):
+        """Validate the scraped data one spilled segment at a time, collecting per-city stats"""
+        seen_room_ids = set()
+        for chunk in self.scraped_data.iter_chunks():
+            data, chunk_stats = validated_records(chunk, seen_room_ids=seen_room_ids)
+            stats.append(chunk_stats)
+            yield data
+    
     def save_scraped_data(self):
         """Save scraped data to files"""
         if not self.scraped_data:
@@ -268,23 +371,71 @@ class AirbnbScraperGUI:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             
             output_format = self.output_format_var.get()
+            stats = []
             
-            if output_format in ["csv", "both"]:
-                csv_filename = f"airbnb_listings_{timestamp}.csv"
-                save_to_csv(self.scraped_data, csv_filename)
-                self.log_message(f"Data saved to CSV: {csv_filename}")
+            if self.delta_export_var.get():
+                # The diff needs the whole run at once, so delta mode collects the validated rows
+                data = [row for chunk in self.validated_chunks(stats) for row in chunk]
+                self.log_validation(len(data), stats)
+                manifest = write_delta_export(data, output_format, timestamp, self.succeeded_pages)
+                self.log_message(f"Delta export: {manifest['inserted']} new, {manifest['updated']} updated, "
+                                 f"{manifest['deleted']} removed, {manifest['unchanged']} unchanged")
+                for filename in manifest["files"]:
+                    self.log_message(f"Delta saved to: {filename}")
+                return
             
+            files = {}
+            if output_format in ["csv", "both"]:
+                files["csv"] = os.path.join("output", f"airbnb_listings_{timestamp}.csv")
             if output_format in ["excel", "both"]:
-                excel_filename = f"airbnb_listings_{timestamp}.xlsx"
-                save_to_excel(self.scraped_data, excel_filename)
-                self.log_message(f"Data saved to Excel: {excel_filename}")
+                files["excel"] = os.path.join("output", f"airbnb_listings_{timestamp}.xlsx")
+            
+            writer = ListingWriter(files.get("csv"), files.get("excel"))
+            for chunk in self.validated_chunks(stats):
+                writer.write(chunk)
+            writer.close()
+            self.log_validation(writer.rows_written, stats)
+            if not writer.rows_written:
+                self.log_message("No listings passed validation; the saved files are empty")
+            
+            # Only keep files that are really on disk so Export never copies a missing file
+            files = {kind: path for kind, path in files.items() if path in writer.files}
+            for kind, path in files.items():
+                self.log_message(f"Data saved to {'CSV' if kind == 'csv' else 'Excel'}: {os.path.basename(path)}")
+            
+            # The saved files now hold the data; free the spilled segments
+            self.saved_files = files
+            self.scraped_data.clear()
             
         except Exception as e:
             self.log_message(f"Error saving data: {str(e)}")
     
+    def log_validation(self, passed, stats):
+        """Log how many listings passed validation and which cities had problems"""
+        self.log_message(f"Validation: {passed} of {len(self.scraped_data)} listings passed")
+        if not stats:
+            return
+        combined = combine_city_stats(stats)
+        for row in combined[combined["valid"] < combined["listings"]].itertuples():
+            self.log_message(f"  {row.city}: {row.valid}/{row.listings} valid "
+                             f"({row.junk_name} junk, {row.missing_price} without price, "
+                             f"{row.duplicate} duplicates)")
+    
+    def export_to(self, filename, kind):
+        """Write the run's data to a user-chosen file of the given kind ("csv" or "excel")"""
+        if kind in self.saved_files:
+            shutil.copyfile(self.saved_files[kind], filename)
+            return
+        if not self.scraped_data:
+            raise ValueError(f"the last run was not saved as {kind}; choose that output format and scrape again")
+        writer = ListingWriter(filename if kind == "csv" else None, filename if kind == "excel" else None)
+        for chunk in self.validated_chunks([]):
+            writer.write(chunk)
+        writer.close()
+    
     def export_data(self):
         """Export scraped data to user-selected location"""
-        if not self.scraped_data:
+        if not self.scraped_data and not self.saved_files:
             messagebox.showwarning("No Data", "No data available to export.")
             return
         
@@ -298,8 +449,7 @@ class AirbnbScraperGUI:
                     title="Save CSV file"
                 )
                 if filename:
-                    df = pd.DataFrame(self.scraped_data)
-                    df.to_csv(filename, index=False, encoding='utf-8')
+                    self.export_to(filename, "csv")
                     self.log_message(f"Data exported to: {filename}")
             
             elif output_format == "excel":
@@ -309,8 +459,7 @@ class AirbnbScraperGUI:
                     title="Save Excel file"
                 )
                 if filename:
-                    df = pd.DataFrame(self.scraped_data)
-                    df.to_excel(filename, index=False, engine='openpyxl')
+                    self.export_to(filename, "excel")
                     self.log_message(f"Data exported to: {filename}")
             
             elif output_format == "both":
@@ -321,8 +470,7 @@ class AirbnbScraperGUI:
                     title="Save CSV file"
                 )
                 if csv_filename:
-                    df = pd.DataFrame(self.scraped_data)
-                    df.to_csv(csv_filename, index=False, encoding='utf-8')
+                    self.export_to(csv_filename, "csv")
                     self.log_message(f"CSV exported to: {csv_filename}")
                 
                 # Save Excel
@@ -332,8 +480,7 @@ class AirbnbScraperGUI:
                     title="Save Excel file"
                 )
                 if excel_filename:
-                    df = pd.DataFrame(self.scraped_data)
-                    df.to_excel(excel_filename, index=False, engine='openpyxl')
+                    self.export_to(excel_filename, "excel")
                     self.log_message(f"Excel exported to: {excel_filename}")
         
         except Exception as e:
@@ -358,8 +505,11 @@ def main():
         if app.is_scraping:
             if messagebox.askokcancel("Quit", "Scraping is in progress. Do you want to quit?"):
                 app.stop_scraping()
+                app.scraped_data.clear()
                 root.destroy()
         else:
+            # Spilled segments are only readable by this session
+            app.scraped_data.clear()
             root.destroy()
     
     root.protocol("WM_DELETE_WINDOW", on_closing)
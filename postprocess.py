@@ -0,0 +1,119 @@
+"""
+Batch post-processing and validation of scraped listings
+
+Runs over a whole batch of listings at once using pandas string kernels instead
+of per-row Python calls: prices are parsed into numeric amount and currency
+columns, text and locations are normalized, junk rows are flagged and per-city
+quality statistics are computed.
+"""
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import pandas as pd
+
+from config import CURRENCY_CODES, DROP_INVALID_LISTINGS, JUNK_NAME_PATTERNS
+from utils import ROOM_ID_PATTERN
+
+TEXT_COLUMNS = ["name", "price", "original_price", "location", "url", "city"]
+PRICE_PATTERN = r"(?P<symbol>[£$€])\s?(?P<amount>[\d,]+(?:\.\d{1,2})?)"
+
+# Quality flags in the order they are reported in the ``issues`` column
+ISSUE_FLAGS = ["junk_name", "missing_price", "missing_url", "duplicate"]
+
+
+def _normalize_text(series: pd.Series) -> pd.Series:
+    """Collapse whitespace and strip a whole text column"""
+    return (
+        series.astype(object)
+        .where(series.notna(), "")
+        .astype(str)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def parse_prices(series: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """Split price strings into a numeric amount and an ISO currency code"""
+    parts = series.str.extract(PRICE_PATTERN)
+    amount = pd.to_numeric(parts["amount"].str.replace(",", "", regex=False), errors="coerce")
+    currency = parts["symbol"].map(CURRENCY_CODES)
+    return amount, currency
+
+
+def process_listings(data: Union[List[Dict], pd.DataFrame],
+                     seen_room_ids: Optional[Set[str]] = None) -> pd.DataFrame:
+    """Clean, parse and flag a batch of listings in one vectorized pass
+
+    Pass the same ``seen_room_ids`` set for consecutive batches of one run so
+    duplicates are also detected across batches; it is updated in place with
+    the room IDs of the rows that passed validation.
+    """
+    df = pd.DataFrame(data).copy()
+    for column in TEXT_COLUMNS:
+        if column not in df.columns:
+            df[column] = "N/A"
+        df[column] = _normalize_text(df[column])
+
+    df["price_amount"], df["currency"] = parse_prices(df["price"])
+    df["original_price_amount"], original_currency = parse_prices(df["original_price"])
+    df["currency"] = df["currency"].fillna(original_currency)
+
+    missing_location = df["location"].isin(["", "N/A"])
+    df["location"] = df["location"].where(~missing_location, df["city"])
+    df["location"] = df["location"].str.replace(r"\s*,\s*", ", ", regex=True)
+
+    df["room_id"] = df["url"].str.extract(ROOM_ID_PATTERN, expand=False)
+
+    junk_pattern = "|".join(f"(?:{pattern})" for pattern in JUNK_NAME_PATTERNS)
+    df["junk_name"] = df["name"].str.contains(junk_pattern, case=False, regex=True)
+    df["missing_price"] = df["price_amount"].isna() & df["original_price_amount"].isna()
+    df["missing_url"] = df["url"].isin(["", "N/A"])
+    # Only copies that pass the other checks compete, so a priceless or junk
+    # first copy never knocks out a good later one
+    candidate = df["room_id"].notna() & ~df[["junk_name", "missing_price", "missing_url"]].any(axis=1)
+    df["duplicate"] = candidate & df["room_id"].where(candidate).duplicated(keep="first")
+    if seen_room_ids is not None:
+        df["duplicate"] |= candidate & df["room_id"].isin(seen_room_ids)
+        seen_room_ids.update(df.loc[candidate & ~df["duplicate"], "room_id"])
+
+    issues = pd.Series("", index=df.index)
+    for flag in ISSUE_FLAGS:
+        issues = issues.where(~df[flag], issues + flag + ";")
+    df["issues"] = issues.str.rstrip(";")
+    df["is_valid"] = ~df[ISSUE_FLAGS].any(axis=1)
+
+    return df
+
+
+def city_quality_stats(df: pd.DataFrame) -> pd.DataFrame:
+    """Summarize validation results per city"""
+    stats = df.groupby("city").agg(
+        listings=("is_valid", "size"),
+        valid=("is_valid", "sum"),
+        junk_name=("junk_name", "sum"),
+        missing_price=("missing_price", "sum"),
+        missing_url=("missing_url", "sum"),
+        duplicate=("duplicate", "sum"),
+        median_price=("price_amount", "median"),
+    )
+    stats["valid_ratio"] = (stats["valid"] / stats["listings"]).round(3)
+    return stats.reset_index()
+
+
+def combine_city_stats(stats: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """Add up the per-city counts of several batches (median prices are not combined)"""
+    combined = pd.concat(list(stats)).drop(columns=["median_price", "valid_ratio"])
+    combined = combined.groupby("city").sum()
+    combined["valid_ratio"] = (combined["valid"] / combined["listings"]).round(3)
+    return combined.reset_index()
+
+
+def validated_records(data: Union[List[Dict], pd.DataFrame], drop_invalid: bool = DROP_INVALID_LISTINGS,
+                      seen_room_ids: Optional[Set[str]] = None) -> Tuple[List[Dict], pd.DataFrame]:
+    """Process a batch and return the rows to save together with per-city stats"""
+    df = process_listings(data, seen_room_ids)
+    stats = city_quality_stats(df)
+    if drop_invalid:
+        df = df[df["is_valid"]].drop(columns=ISSUE_FLAGS + ["issues", "is_valid"])
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict("records"), stats
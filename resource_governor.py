@@ -0,0 +1,162 @@
+"""
+Resource governor keeping memory flat during long scraping runs
+
+Watches the resident memory of the Python process and of the Chrome processes
+spawned by Selenium, recycles the WebDriver after too many pages or too much
+memory, and spills accumulated results to JSON Lines segment files on disk so
+``scraped_data`` does not grow without bound.
+"""
+
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    import psutil
+except ImportError:  # memory checks are skipped without psutil
+    psutil = None
+
+from config import (
+    MAX_DRIVER_PAGES,
+    MAX_DRIVER_RSS_MB,
+    MAX_PROCESS_RSS_MB,
+    RESULT_SEGMENT_FOLDER,
+    RESULT_SPILL_THRESHOLD,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _rss_mb(process) -> float:
+    try:
+        return process.memory_info().rss / (1024 * 1024)
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return 0.0
+
+
+def process_rss_mb() -> Optional[float]:
+    """Resident memory of the Python process, or None without psutil"""
+    if psutil is None:
+        return None
+    return _rss_mb(psutil.Process())
+
+
+def driver_rss_mb(driver) -> Optional[float]:
+    """Resident memory of chromedriver and every Chrome process it spawned"""
+    if psutil is None or driver is None:
+        return None
+    try:
+        service_process = psutil.Process(driver.service.process.pid)
+        processes = [service_process] + service_process.children(recursive=True)
+    except (AttributeError, psutil.NoSuchProcess, psutil.AccessDenied):
+        return None
+    return sum(_rss_mb(process) for process in processes)
+
+
+class ResultBuffer:
+    """List-like store of scraped listings that spills to disk past a threshold"""
+
+    def __init__(self, spill_threshold: int = RESULT_SPILL_THRESHOLD,
+                 segment_folder: str = RESULT_SEGMENT_FOLDER):
+        self.spill_threshold = spill_threshold
+        run_name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{id(self):x}"
+        self.segment_folder = os.path.join(segment_folder, run_name)
+        self.segments: List[str] = []
+        self.spilled_count = 0
+        self._memory: List[Dict] = []
+
+    def extend(self, listings: Iterable[Dict]):
+        self._memory.extend(listings)
+        if len(self._memory) >= self.spill_threshold:
+            self.spill()
+
+    def append(self, listing: Dict):
+        self.extend([listing])
+
+    def spill(self):
+        """Write the in-memory listings to a new segment file"""
+        if not self._memory:
+            return
+        if not os.path.exists(self.segment_folder):
+            os.makedirs(self.segment_folder)
+        path = os.path.join(self.segment_folder, f"segment_{len(self.segments) + 1:04d}.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for listing in self._memory:
+                f.write(json.dumps(listing, ensure_ascii=False) + "\n")
+        self.segments.append(path)
+        self.spilled_count += len(self._memory)
+        logger.info(f"Spilled {len(self._memory)} listings to {path}")
+        self._memory = []
+
+    def __iter__(self) -> Iterator[Dict]:
+        for path in self.segments:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+        yield from self._memory
+
+    def __len__(self) -> int:
+        return self.spilled_count + len(self._memory)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def iter_chunks(self) -> Iterator[List[Dict]]:
+        """Yield the listings one segment at a time, ending with those still in memory"""
+        for path in self.segments:
+            with open(path, "r", encoding="utf-8") as f:
+                yield [json.loads(line) for line in f]
+        if self._memory:
+            yield list(self._memory)
+
+    def clear(self):
+        """Forget all listings and delete this buffer's segment files"""
+        if os.path.exists(self.segment_folder):
+            shutil.rmtree(self.segment_folder, ignore_errors=True)
+        self.segments = []
+        self.spilled_count = 0
+        self._memory = []
+
+
+class ResourceGovernor:
+    """Recycles the scraper's driver and spills results when limits are reached"""
+
+    def __init__(self, max_driver_pages: int = MAX_DRIVER_PAGES,
+                 max_driver_rss_mb: float = MAX_DRIVER_RSS_MB,
+                 max_process_rss_mb: float = MAX_PROCESS_RSS_MB):
+        self.max_driver_pages = max_driver_pages
+        self.max_driver_rss_mb = max_driver_rss_mb
+        self.max_process_rss_mb = max_process_rss_mb
+        self.pages_since_restart = 0
+        self.driver_restarts = 0
+
+        if psutil is None:
+            logger.warning("psutil is not installed; only page-count limits are enforced")
+
+    def after_page(self, scraper, buffer: Optional[ResultBuffer] = None, callback=None):
+        """Check limits after a page was scraped and act on any that are exceeded"""
+        self.pages_since_restart += 1
+
+        if scraper.driver is not None:
+            reason = None
+            if self.pages_since_restart >= self.max_driver_pages:
+                reason = f"{self.pages_since_restart} pages"
+            else:
+                driver_mb = driver_rss_mb(scraper.driver)
+                if driver_mb is not None and driver_mb > self.max_driver_rss_mb:
+                    reason = f"{driver_mb:.0f} MB"
+            if reason:
+                if callback:
+                    callback(f"Restarting browser after {reason}")
+                scraper.restart_driver()
+                self.pages_since_restart = 0
+                self.driver_restarts += 1
+
+        if buffer is not None:
+            python_mb = process_rss_mb()
+            if python_mb is not None and python_mb > self.max_process_rss_mb:
+                logger.info(f"Process memory at {python_mb:.0f} MB; spilling results early")
+                buffer.spill()
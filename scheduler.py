@@ -0,0 +1,133 @@
+"""
+Per-city scheduling by freshness, price volatility and scrape cost
+
+The scheduler keeps a small history for every city: when it was last scraped
+successfully, how much its median price moves between runs and how long and
+how reliably it scrapes. Each run's queue then puts stale, fast-changing and
+cheap cities first, skips cities that are still fresh, and stops at an optional
+time budget.
+"""
+
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from config import (
+    CITY_FRESHNESS_SLA_HOURS,
+    CITY_SLA_OVERRIDES,
+    DEFAULT_CITY_COST_SECONDS,
+    OUTPUT_FOLDER,
+    SCHEDULE_STATE_FILENAME,
+    VOLATILITY_WEIGHT,
+)
+from postprocess import parse_prices
+from utils import write_json_atomic
+
+# Weight given to the newest observation in the moving averages
+SMOOTHING = 0.3
+
+
+def median_price(listings: List[Dict]) -> Optional[float]:
+    """Median numeric price of a city's listings, or None if none has a price"""
+    prices = pd.Series([str(listing.get("price", "")) for listing in listings], dtype=object)
+    amounts, _ = parse_prices(prices)
+    median = amounts.median()
+    return None if pd.isna(median) else float(median)
+
+
+class CityScheduler:
+    def __init__(self, state_path: Optional[str] = None):
+        self.state_path = state_path or os.path.join(OUTPUT_FOLDER, SCHEDULE_STATE_FILENAME)
+        self.cities: Dict[str, Dict] = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.cities = json.load(f)
+
+    def save(self):
+        write_json_atomic(self.state_path, self.cities, indent=2)
+
+    def record(self, city: str, listings: List[Dict], duration: float, succeeded: bool,
+               now: Optional[float] = None):
+        """Update a city's history after it was scraped; an empty but successful scrape still counts as fresh"""
+        now = now or time.time()
+        state = self.cities.setdefault(city, {
+            "first_attempt": now,
+            "last_success": None,
+            "attempts": 0,
+            "failures": 0,
+            "avg_duration": None,
+            "median_price": None,
+            "volatility": 0.0,
+        })
+        state.setdefault("first_attempt", now)
+        state["attempts"] += 1
+        state["avg_duration"] = duration if state["avg_duration"] is None else (
+            SMOOTHING * duration + (1 - SMOOTHING) * state["avg_duration"]
+        )
+
+        if not succeeded:
+            state["failures"] += 1
+            return
+
+        state["last_success"] = now
+        price = median_price(listings)
+        if price is not None:
+            previous = state["median_price"]
+            if previous:
+                change = abs(price - previous) / previous
+                state["volatility"] = SMOOTHING * change + (1 - SMOOTHING) * state["volatility"]
+            state["median_price"] = price
+
+    def sla_seconds(self, city: str) -> float:
+        """Freshness SLA for a city, shortened for cities whose prices move a lot"""
+        sla_hours = CITY_SLA_OVERRIDES.get(city, CITY_FRESHNESS_SLA_HOURS)
+        volatility = self.cities.get(city, {}).get("volatility", 0.0)
+        return sla_hours * 3600 / (1 + VOLATILITY_WEIGHT * volatility)
+
+    def staleness(self, city: str, now: Optional[float] = None) -> float:
+        """Age of a city's data as a multiple of its SLA; never attempted cities are always due
+
+        A city that has been tried but never succeeded ages from its first attempt,
+        so its growing failure cost can still push it behind cities that do scrape.
+        """
+        state = self.cities.get(city, {})
+        since = state.get("last_success") or state.get("first_attempt")
+        if not state.get("attempts") or since is None:
+            return float("inf")
+        now = now or time.time()
+        return (now - since) / self.sla_seconds(city)
+
+    def expected_cost(self, city: str) -> float:
+        """Expected seconds to get a successful scrape of a city, counting retries"""
+        state = self.cities.get(city)
+        if not state or state["avg_duration"] is None:
+            return DEFAULT_CITY_COST_SECONDS
+        success_rate = (state["attempts"] - state["failures"] + 1) / (state["attempts"] + 1)
+        return max(state["avg_duration"], 1.0) / success_rate
+
+    def build_queue(self, cities: List[str], time_budget: Optional[float] = None,
+                    include_fresh: bool = False, now: Optional[float] = None) -> List[str]:
+        """Order cities by staleness per second of cost, dropping fresh ones and those over budget"""
+        now = now or time.time()
+        scored = []
+        for index, city in enumerate(cities):
+            staleness = self.staleness(city, now)
+            if staleness < 1 and not include_fresh:
+                continue
+            cost = self.expected_cost(city)
+            score = staleness / cost if staleness != float("inf") else float("inf")
+            # Never attempted cities go first, in their configured order
+            scored.append((-score, index if score == float("inf") else 0, city, cost))
+        scored.sort()
+
+        queue = []
+        spent = 0.0
+        for _, _, city, cost in scored:
+            if time_budget is not None and spent + cost > time_budget:
+                continue
+            queue.append(city)
+            spent += cost
+        return queue
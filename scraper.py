@@ -14,19 +14,80 @@ from selenium_stealth import stealth
 import requests
 from bs4 import BeautifulSoup
 
-from config import HEADERS, TIMEOUT, LISTINGS_PER_CITY
+from config import HEADERS, TIMEOUT, LISTINGS_PER_CITY, USE_PROXIES, PROXY_LIST
 from utils import add_delay, get_random_proxy, clean_price, clean_text, generate_airbnb_search_url
+from failures import (
+    BreakerBoard, ScrapeFailure, classify_failure, counts_against, looks_blocked,
+    BLOCKED, CIRCUIT_OPEN, DRIVER_CRASH, SELECTOR_MISS,
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+# Cards on the search page rendered by the browser (the Selenium backend)
+CARD_SELECTOR = "[data-testid='card-container']"
+# Elements the browser does not render (aria-hidden content is still shown on screen)
+HIDDEN_SELECTOR = "[hidden], [style*='display:none'], [style*='display: none'], " \
+                  "[style*='visibility:hidden'], [style*='visibility: hidden']"
+
+
+def _split_prices(price_txt: str):
+    """Return (price, original_price) from a card's price text"""
+    price = original_price = "N/A"
+    # Accessible duplicates of the visible amounts must not count as a second price
+    found = list(dict.fromkeys(re.findall(r"£\d[\d,]*", price_txt)))
+    if found:
+        if len(found) == 1:
+            price = clean_price(found[0])
+        else:
+            original_price = clean_price(found[0])
+            price = clean_price(found[1])
+    return price, original_price
+
+
+def _visible_text(soup: BeautifulSoup) -> str:
+    """Title and body text of a parsed page, leaving out scripts and styles"""
+    for element in soup.find_all(["script", "style", "noscript", "template"]):
+        element.decompose()
+    return soup.get_text(" ", strip=True)
+
+
+def extract_listings_from_html(html: str, city: str, backend: str,
+                               limit: Optional[int] = LISTINGS_PER_CITY) -> List[Dict]:
+    """Run the listing extractors over a saved search page without a browser
+
+    Uses exactly the extractor the live scrape used for that backend, so a
+    selector fix or new field applies to live runs and replays alike.
+    """
+    soup = BeautifulSoup(html, "lxml")
+    if backend == "selenium":
+        elements = soup.select(CARD_SELECTOR)
+        extract = AirbnbScraper._extract_listing_data_html
+    else:
+        elements = soup.find_all("div", class_="lxq01kf")
+        extract = AirbnbScraper._extract_listing_data_bs4
+
+    listings = []
+    for element in elements[:limit]:
+        data = extract(element, city)
+        if data:
+            listings.append(data)
+    return listings
+
+
 class AirbnbScraper:
-    def __init__(self, use_selenium: bool = True):
+    def __init__(self, use_selenium: bool = True, capture=None, dead_letters=None):
         self.session = requests.Session()
         self.session.headers.update(HEADERS)
         self.use_selenium = use_selenium
         self.driver = None
+        self.capture = capture  # optional PageCapture storing raw pages for replay
+        self.dead_letters = dead_letters  # optional DeadLetterQueue for failed cities
+        self.breakers = BreakerBoard()
+        self.last_failure: Optional[ScrapeFailure] = None
+        self._last_proxy: Optional[str] = None
 
         if self.use_selenium:
             self.setup_selenium()
@@ -77,25 +138,82 @@ class AirbnbScraper:
             logger.error(f"Failed to initialize Selenium: {e}")
             self.use_selenium = False
 
-    def scrape_city_listings(self, city: str, callback=None) -> List[Dict]:
-        logger.info(f"Scraping listings for {city}")
+    def restart_driver(self):
+        """Quit the current WebDriver and start a fresh one to release browser memory"""
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                logger.warning(f"Error quitting WebDriver: {e}")
+            self.driver = None
+        self.use_selenium = True
+        self.setup_selenium()
+
+    def scrape_city_listings(self, city: str, callback=None, page: int = 0) -> List[Dict]:
+        logger.info(f"Scraping listings for {city}" + (f" (page {page + 1})" if page else ""))
 
         listings = []
-        url = generate_airbnb_search_url(city)
+        url = generate_airbnb_search_url(city, page)
+        backend = "selenium" if self.use_selenium and self.driver else "requests"
+        self.last_failure = None
+        self._last_proxy = None
 
         try:
-            if self.use_selenium and self.driver:
-                listings = self._scrape_with_selenium(url, city, callback)
+            for key in (backend, f"city:{city}"):
+                if not self.breakers.allow(key):
+                    raise ScrapeFailure(CIRCUIT_OPEN, f"circuit open for {key}",
+                                        retry_after=self.breakers.get(key).retry_in(), breaker_key=key)
+
+            if backend == "selenium":
+                listings = self._scrape_with_selenium(url, city, callback, page)
             else:
-                listings = self._scrape_with_requests(url, city, callback)
+                listings = self._scrape_with_requests(url, city, callback, page)
         except Exception as e:
-            logger.error(f"Error scraping {city}: {e}")
-            if callback:
-                callback(f"Error scraping {city}: {e}")
+            self._handle_failure(e, city, page, backend, callback)
+        else:
+            for key in self._breaker_keys(backend, city):
+                self.breakers.get(key).record_success()
+            if self.dead_letters:
+                self.dead_letters.remove(city, page)
 
         logger.info(f"Found {len(listings)} listings for {city}")
         return listings
 
+    def _breaker_keys(self, backend: str, city: str) -> List[str]:
+        """Circuit breakers affected by the outcome of the current page"""
+        keys = [backend, f"city:{city}"]
+        if self._last_proxy:
+            keys.append(f"proxy:{self._last_proxy}")
+        return keys
+
+    def _handle_failure(self, exc: Exception, city: str, page: int, backend: str, callback=None):
+        """Classify a failure, update circuit breakers and dead-letter the task"""
+        failure = exc if isinstance(exc, ScrapeFailure) else ScrapeFailure(classify_failure(exc), str(exc))
+        self.last_failure = failure
+
+        first_line = (str(failure).splitlines() or [""])[0]
+        message = f"Error scraping {city} [{failure.kind}]: {first_line}"
+        logger.error(message)
+        if callback:
+            callback(message)
+
+        if failure.kind != CIRCUIT_OPEN:
+            # A city that keeps timing out must not trip the backend shared by every city
+            for key in self._breaker_keys(backend, city):
+                if not counts_against(key, failure.kind):
+                    continue
+                breaker = self.breakers.get(key)
+                breaker.record_failure(failure.kind)
+                if not breaker.allow():
+                    logger.warning(f"Circuit opened for {key} after {breaker.consecutive_failures} failures")
+
+        if failure.kind == DRIVER_CRASH and backend == "selenium":
+            logger.warning("WebDriver appears to have crashed; restarting it")
+            self.restart_driver()
+
+        if self.dead_letters:
+            self.dead_letters.add(city, page, failure.kind, backend, str(failure))
+
     def _accept_cookies(self):
         if not self.driver:
             logger.warning("Selenium driver not initialized; cannot accept cookies.")
@@ -128,126 +246,138 @@ class AirbnbScraper:
             logger.warning(f"Failed to accept cookies: {e}")
 
 
-    def _scrape_with_selenium(self, url: str, city: str, callback=None) -> List[Dict]:
+    def _visible_page_text(self) -> str:
+        """Title and rendered body text of the current page, without scripts or markup"""
+        try:
+            body = self.driver.execute_script("return document.body ? document.body.innerText : '';")
+            return f"{self.driver.title}\n{body or ''}"
+        except Exception as e:
+            logger.warning(f"Could not read page text: {e}")
+            return ""
+
+    def _scrape_with_selenium(self, url: str, city: str, callback=None, page: int = 0) -> List[Dict]:
         listings = []
         if not self.driver:
             logger.error("Selenium driver is not initialized; cannot scrape.")
             return listings
-        try:
-            self.driver.get(url)
-            self._accept_cookies()
 
+        self.driver.get(url)
+        # Check for a block page before spending the cookie and listing waits on it
+        if looks_blocked(self._visible_page_text()):
+            raise ScrapeFailure(BLOCKED, f"block or captcha page served for {url}")
+        self._accept_cookies()
+
+        try:
             WebDriverWait(self.driver, 20).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, "[data-testid='listing-card-title']"))
             )
+        except Exception as e:
+            raise ScrapeFailure(classify_failure(e, self._visible_page_text()), f"no listings appeared: {e}")
 
-            listing_elements = self.driver.find_elements(By.CSS_SELECTOR, "[data-testid='card-container']")
+        # Parse the rendered page the same way captured pages are replayed
+        html = self.driver.page_source
+        if self.capture:
+            self.capture.save(city, page, "selenium", url, html)
 
-            for i, element in enumerate(listing_elements[:LISTINGS_PER_CITY]):
-                try:
-                    data = self._extract_listing_data_selenium(element, city)
-                    if data:
-                        listings.append(data)
-
-                    if callback:
-                        callback(f"Scraped {i+1}/{min(len(listing_elements), LISTINGS_PER_CITY)} listings from {city}")
-                except Exception as e:
-                    logger.error(f"Error extracting listing data: {e}")
-                    continue
-        except Exception as e:
-            logger.error(f"Selenium scraping error: {e}")
+        listing_elements = BeautifulSoup(html, "lxml").select(CARD_SELECTOR)
+
+        for i, element in enumerate(listing_elements[:LISTINGS_PER_CITY]):
+            try:
+                data = self._extract_listing_data_html(element, city)
+                if data:
+                    listings.append(data)
+
+                if callback:
+                    callback(f"Scraped {i+1}/{min(len(listing_elements), LISTINGS_PER_CITY)} listings from {city}")
+            except Exception as e:
+                logger.error(f"Error extracting listing data: {e}")
+                continue
+
+        if listing_elements and not listings:
+            raise ScrapeFailure(SELECTOR_MISS, f"{len(listing_elements)} cards found but none could be extracted")
 
         return listings
 
-    def _scrape_with_requests(self, url: str, city: str, callback=None) -> List[Dict]:
+    def _scrape_with_requests(self, url: str, city: str, callback=None, page: int = 0) -> List[Dict]:
         listings = []
-        try:
-            proxy = get_random_proxy()
-            proxies = {"http": proxy, "https": proxy} if proxy else None
 
-            response = self.session.get(url, proxies=proxies, timeout=TIMEOUT)
-            response.raise_for_status()
+        open_proxies = self.breakers.open_keys("proxy:")
+        proxy = get_random_proxy(exclude=[key[len("proxy:"):] for key in open_proxies])
+        if USE_PROXIES and PROXY_LIST and proxy is None:
+            retry_after = min((self.breakers.get(key).retry_in() for key in open_proxies), default=None)
+            raise ScrapeFailure(CIRCUIT_OPEN, "circuit open for every configured proxy",
+                                retry_after=retry_after, breaker_key="proxy:*")
+        self._last_proxy = proxy
+        proxies = {"http": proxy, "https": proxy} if proxy else None
 
-            soup = BeautifulSoup(response.content, "lxml")
-            listing_elements = soup.find_all("div", class_="lxq01kf")[:LISTINGS_PER_CITY]
+        response = self.session.get(url, proxies=proxies, timeout=TIMEOUT)
+        response.raise_for_status()
+        soup = BeautifulSoup(response.content, "lxml")
+        if looks_blocked(_visible_text(soup)):
+            raise ScrapeFailure(BLOCKED, f"block or captcha page served for {url}")
 
-            for i, element in enumerate(listing_elements):
-                try:
-                    data = self._extract_listing_data_bs4(element, city)
-                    if data:
-                        listings.append(data)
-                    if callback:
-                        callback(f"Scraped {i+1}/{len(listing_elements)} listings from {city}")
-                except Exception as e:
-                    logger.error(f"Error extracting listing data: {e}")
-                    continue
-                add_delay()
+        if self.capture:
+            self.capture.save(city, page, "requests", url, response.text)
 
-        except Exception as e:
-            logger.error(f"Requests scraping error: {e}")
+        listing_elements = soup.find_all("div", class_="lxq01kf")[:LISTINGS_PER_CITY]
 
-        return listings
+        for i, element in enumerate(listing_elements):
+            try:
+                data = self._extract_listing_data_bs4(element, city)
+                if data:
+                    listings.append(data)
+                if callback:
+                    callback(f"Scraped {i+1}/{len(listing_elements)} listings from {city}")
+            except Exception as e:
+                logger.error(f"Error extracting listing data: {e}")
+                continue
+            add_delay()
+
+        if listing_elements and not listings:
+            raise ScrapeFailure(SELECTOR_MISS, f"{len(listing_elements)} cards found but none could be extracted")
 
-    def _extract_listing_data_selenium(self, element, city: str) -> Optional[Dict]:
-        if not self.driver:
-            logger.warning("Selenium driver is not initialized; cannot extract listing data.")
-            return None
+        return listings
 
+    @staticmethod
+    def _extract_listing_data_html(element, city: str) -> Optional[Dict]:
+        """Extract a listing card from the browser-rendered page HTML (live or captured)"""
         try:
-            # Name
-            try:
-                name_el = WebDriverWait(element, 5).until(
-                    EC.visibility_of_element_located((By.CSS_SELECTOR, "[data-testid='listing-card-title']"))
-                )
-                name = clean_text(name_el.text)
-            except Exception:
+            # Text that is hidden in the browser must not leak into the fields
+            for hidden in element.select(HIDDEN_SELECTOR):
+                hidden.decompose()
+
+            name_el = element.select_one("[data-testid='listing-card-title']")
+            if not name_el:
                 return None
+            name = clean_text(name_el.get_text(" ", strip=True))
 
-            # Subtitle
-            try:
-                subtitle_el = element.find_element(By.CSS_SELECTOR, "[data-testid='listing-card-name']")
-                subtitle = clean_text(subtitle_el.text)
+            subtitle_el = element.select_one("[data-testid='listing-card-name']")
+            if subtitle_el:
+                subtitle = clean_text(subtitle_el.get_text(" ", strip=True))
                 if subtitle:
                     name = f"{name} — {subtitle}"
-            except Exception:
-                pass
 
-            # Prices
             price = original_price = "N/A"
-            try:
-                price_txt = element.find_element(By.CSS_SELECTOR, "._w3xh25").text
-                found = re.findall(r"£\d[\d,]*", price_txt)
-                if found:
-                    if len(found) == 1:
-                        price = clean_price(found[0])
-                    else:
-                        original_price = clean_price(found[0])
-                        price = clean_price(found[1])
-            except Exception:
-                pass
+            price_el = element.select_one("._w3xh25")
+            if price_el:
+                price, original_price = _split_prices(price_el.get_text(" "))
 
             if price == "N/A" and original_price == "N/A":
                 return None
 
-            # URL
             url = "N/A"
-            try:
-                href = element.find_element(By.TAG_NAME, "a").get_attribute("href")
+            url_el = element.find("a")
+            if url_el:
+                href = url_el.get("href")
                 if href:
                     url = href if href.startswith("http") else f"https://www.airbnb.com{href}"
-            except Exception:
-                pass
 
-            # Location
             location = city
-            try:
-                loc_txt = element.find_element(By.CSS_SELECTOR, "[class*='atm_7l_1kw7nm4']").text
-                location = clean_text(loc_txt.splitlines()[0])
-            except Exception:
-                pass
-
-            # Rating and reviews (optional)
-            # Skipped here, but can be added if needed
+            loc_el = element.select_one("[class*='atm_7l_1kw7nm4']")
+            if loc_el:
+                loc_lines = loc_el.get_text("\n", strip=True).splitlines()
+                if loc_lines:
+                    location = clean_text(loc_lines[0])
 
             return {
                 "name": name,
@@ -257,12 +387,12 @@ class AirbnbScraper:
                 "url": url,
                 "city": city,
             }
-
         except Exception as e:
             logger.error(f"Error extracting listing: {e}")
             return None
 
-    def _extract_listing_data_bs4(self, element, city: str) -> Optional[Dict]:
+    @staticmethod
+    def _extract_listing_data_bs4(element, city: str) -> Optional[Dict]:
         try:
             name_elem = element.find("div", class_="t1jojoys")
             name = clean_text(name_elem.get_text()) if name_elem else "N/A"
@@ -0,0 +1,23 @@
+from capture import PageCapture, reprocess, validate_runs
+
+CARD = """
+<div data-testid="card-container">
+  <a href="/rooms/42"></a>
+  <div data-testid="listing-card-title">Flat in Austin</div>
+  <div class="_w3xh25"><span>{price}</span> night</div>
+</div>
+"""
+
+
+def test_same_room_in_two_runs_is_kept_per_run(tmp_path):
+    folders = []
+    for run, amount in [("run1", "£100"), ("run2", "£140")]:
+        capture = PageCapture(str(tmp_path), run)
+        capture.save("Austin", 0, "selenium", "https://www.airbnb.com/s/Austin/homes",
+                     CARD.format(price=amount))
+        folders.append(capture.folder)
+
+    raw = reprocess(folders, workers=1)
+    data = validate_runs(raw)
+
+    assert sorted((row["capture_run"], row["price"]) for row in data) == [("run1", "£100"), ("run2", "£140")]
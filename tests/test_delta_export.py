@@ -0,0 +1,41 @@
+from delta_export import compute_delta, listing_hash
+
+
+def listing(room, price, city="A", page=0):
+    return {"url": f"https://www.airbnb.com/rooms/{room}", "name": f"Room {room}",
+            "price": price, "city": city, "page": page}
+
+
+def snapshot(*listings):
+    return {str(room): {"hash": listing_hash(row), "row": row}
+            for room, row in ((row["url"].rsplit("/", 1)[1], row) for row in listings)}
+
+
+def test_insert_update_and_unchanged():
+    previous = snapshot(listing(1, "£100"), listing(2, "£50"))
+    changes = compute_delta([listing(1, "£100"), listing(2, "£60"), listing(3, "£70")], previous, {("A", 0)})
+
+    assert [row["price"] for row in changes["insert"]] == ["£70"]
+    assert [row["price"] for row in changes["update"]] == ["£60"]
+    assert changes["delete"] == []
+
+
+def test_missing_listing_on_succeeded_page_is_deleted():
+    previous = snapshot(listing(1, "£100"), listing(2, "£50"))
+    changes = compute_delta([listing(1, "£100")], previous, {("A", 0)})
+
+    assert [row["url"] for row in changes["delete"]] == ["https://www.airbnb.com/rooms/2"]
+
+
+def test_failed_or_skipped_pages_report_no_deletes():
+    previous = snapshot(listing(1, "£100", page=0), listing(2, "£50", page=1), listing(3, "£80", city="B"))
+    changes = compute_delta([listing(1, "£100")], previous, {("A", 0)})
+
+    assert changes == {"insert": [], "update": [], "delete": []}
+
+
+def test_room_id_column_is_preferred_over_url():
+    previous = snapshot(listing(1, "£100"))
+    row = {**listing(1, "£100"), "url": "N/A", "room_id": "1"}
+
+    assert compute_delta([row], previous, {("A", 0)}) == {"insert": [], "update": [], "delete": []}
@@ -0,0 +1,74 @@
+import pytest
+import requests
+from requests.models import Response
+from selenium.common import exceptions as selenium_errors
+from urllib3 import exceptions as urllib3_errors
+
+import failures
+from failures import (
+    BLOCKED, DRIVER_CRASH, NETWORK, SELECTOR_MISS, TIMEOUT, UNKNOWN,
+    CircuitBreaker, ScrapeFailure, classify_failure, counts_against,
+)
+
+
+def http_error(status):
+    response = Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+@pytest.mark.parametrize("exc, kind", [
+    (ScrapeFailure(SELECTOR_MISS, "no cards"), SELECTOR_MISS),
+    (http_error(429), BLOCKED),
+    (http_error(500), NETWORK),
+    (requests.ConnectTimeout(), TIMEOUT),
+    (requests.ReadTimeout(), TIMEOUT),
+    (requests.ConnectionError(), NETWORK),
+    (requests.exceptions.ChunkedEncodingError(), NETWORK),
+    (selenium_errors.TimeoutException("page load"), TIMEOUT),
+    (selenium_errors.StaleElementReferenceException(), SELECTOR_MISS),
+    (selenium_errors.InvalidSessionIdException(), DRIVER_CRASH),
+    (selenium_errors.WebDriverException("chrome not reachable"), DRIVER_CRASH),
+    (selenium_errors.WebDriverException("something else"), UNKNOWN),
+    (urllib3_errors.MaxRetryError(None, "http://localhost:9515"), DRIVER_CRASH),
+    (ConnectionRefusedError(), DRIVER_CRASH),
+    (ValueError("boom"), UNKNOWN),
+])
+def test_classify_failure(exc, kind):
+    assert classify_failure(exc) == kind
+
+
+def test_visible_block_text_wins():
+    assert classify_failure(selenium_errors.TimeoutException(), "Are you a human?") == BLOCKED
+
+
+def test_only_backend_level_kinds_count_against_the_backend():
+    assert counts_against("city:Austin, TX", TIMEOUT)
+    assert not counts_against("requests", TIMEOUT)
+    assert counts_against("selenium", DRIVER_CRASH)
+    assert counts_against("proxy:http://p:1", NETWORK)
+    assert not counts_against("proxy:http://p:1", SELECTOR_MISS)
+
+
+def test_circuit_breaker_opens_and_half_opens(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(failures.time, "time", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+
+    breaker.record_failure(TIMEOUT)
+    assert breaker.state == "closed"
+    breaker.record_failure(TIMEOUT)
+    assert breaker.state == "open" and not breaker.allow()
+    assert breaker.retry_in() == 60
+
+    now[0] += 60
+    assert breaker.state == "half_open" and breaker.allow()
+    assert breaker.retry_in() == 0
+
+    # A failed trial re-opens the breaker straight away
+    breaker.record_failure(TIMEOUT)
+    assert breaker.state == "open"
+
+    now[0] += 60
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.consecutive_failures == 0
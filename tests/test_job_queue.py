@@ -0,0 +1,200 @@
+import time
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue, run_worker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=60, max_attempts=2, retry_delay=0)
+
+
+class FakeScraper:
+    """Stands in for AirbnbScraper; fails the cities it is told to"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.last_failure = None
+        self.calls = []
+
+    def scrape_city_listings(self, city, callback=None, page=0):
+        self.calls.append((city, page))
+        if city in self.failing:
+            from failures import ScrapeFailure, TIMEOUT
+            self.last_failure = ScrapeFailure(TIMEOUT, "timed out")
+            return []
+        self.last_failure = None
+        return [{"url": f"https://www.airbnb.com/rooms/{len(self.calls)}", "city": city}]
+
+
+def test_enqueue_ignores_duplicates(queue):
+    assert queue.enqueue(["A", "B"], pages=2) == 4
+    assert queue.enqueue(["A"], pages=1) == 0
+    assert queue.counts() == {"pending": 4}
+
+
+def test_claim_prefers_priority(queue):
+    queue.enqueue(["low"], priority=1)
+    queue.enqueue(["high"], priority=5)
+    assert queue.claim("w1")["city"] == "high"
+    assert queue.claim("w1")["city"] == "low"
+    assert queue.claim("w1") is None
+
+
+def test_expired_lease_is_requeued_and_stale_complete_rejected(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.05)
+    queue.enqueue(["A"])
+    task = queue.claim("w1")
+    time.sleep(0.1)
+
+    retaken = queue.claim("w2")
+    assert retaken["id"] == task["id"]
+    assert retaken["attempts"] == 2
+    assert not queue.heartbeat(task["id"], "w1")
+    assert not queue.complete(task["id"], "w1", [{"url": "stale"}])
+    assert queue.complete(retaken["id"], "w2", [{"url": "fresh"}])
+    assert queue.merged_results() == [{"url": "fresh", "page": 0}]
+
+
+def test_fail_counts_attempts_until_failed(queue):
+    queue.enqueue(["A"])
+    queue.fail(queue.claim("w1")["id"], "w1", "boom")
+    assert queue.counts() == {"pending": 1}
+    queue.fail(queue.claim("w1")["id"], "w1", "boom")
+    assert queue.counts() == {"failed": 1}
+    assert queue.is_finished()
+
+
+def test_release_does_not_use_an_attempt(queue):
+    queue.enqueue(["A"])
+    task = queue.claim("w1")
+    queue.release(task["id"], "w1")
+    assert queue.claim("w2")["attempts"] == 1
+
+
+def test_merged_results_drop_repeated_urls(queue):
+    queue.enqueue(["A", "B"])
+    first, second = queue.claim("w1"), queue.claim("w1")
+    queue.complete(first["id"], "w1", [{"url": "u1"}, {"url": "N/A"}])
+    queue.complete(second["id"], "w1", [{"url": "u1"}, {"url": "N/A"}, {"url": "u2"}])
+    assert [listing["url"] for listing in queue.merged_results()] == ["u1", "N/A", "N/A", "u2"]
+
+
+def test_run_worker_completes_and_fails_tasks(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "add_delay", lambda: None)
+    queue.enqueue(["A", "Bad", "C"])
+    scraper = FakeScraper(failing={"Bad"})
+
+    completed = run_worker(queue, scraper, "w1", heartbeat_interval=0.01)
+
+    assert completed == 2
+    assert queue.counts() == {"done": 2, "failed": 1}
+    assert scraper.calls.count(("Bad", 0)) == 2
+    assert {listing["city"] for listing in queue.merged_results()} == {"A", "C"}
+
+
+def test_city_results_are_recorded_once(queue):
+    queue.enqueue(["A", "B"])
+    for _ in range(2):
+        task = queue.claim("w1")
+        if task["city"] == "A":
+            queue.complete(task["id"], "w1", [{"url": "a"}])
+        else:
+            queue.fail(task["id"], "w1", "timeout")
+    queue.fail(queue.claim("w1")["id"], "w1", "timeout")
+
+    results = queue.city_results()
+    assert set(results) == {"A", "B"}
+    assert results["A"]["listings"] == [{"url": "a"}]
+    assert results["B"]["completed_at"] is not None
+    assert (results["A"]["succeeded"], results["B"]["succeeded"]) == (True, False)
+
+    queue.mark_recorded(results["A"]["task_ids"] + results["B"]["task_ids"])
+    assert queue.city_results() == {}
+
+
+def test_old_database_gains_new_columns(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, city TEXT NOT NULL, "
+                 "page INTEGER NOT NULL DEFAULT 0, priority REAL NOT NULL DEFAULT 0, "
+                 "status TEXT NOT NULL DEFAULT 'pending', worker_id TEXT, lease_expires REAL, "
+                 "attempts INTEGER NOT NULL DEFAULT 0, error TEXT, result TEXT, claimed_at REAL, "
+                 "duration REAL, updated_at REAL NOT NULL, UNIQUE (city, page))")
+    conn.commit()
+    conn.close()
+
+    queue = JobQueue(path)
+    queue.enqueue(["A"])
+    task = queue.claim("w1")
+    assert queue.complete(task["id"], "w1", [])
+    assert queue.city_results()["A"]["task_ids"] == [task["id"]]
+
+
+def test_run_worker_waits_out_open_circuit(queue, monkeypatch):
+    from failures import CIRCUIT_OPEN, ScrapeFailure
+
+    delays = []
+    monkeypatch.setattr(job_queue, "add_delay", lambda: delays.append(1))
+    sleeps = []
+    monkeypatch.setattr(job_queue.time, "sleep", sleeps.append)
+    queue.enqueue(["A"])
+    scraper = FakeScraper()
+    outcomes = [ScrapeFailure(CIRCUIT_OPEN, "circuit open for selenium", retry_after=42), None]
+
+    def scrape(city, callback=None, page=0):
+        scraper.last_failure = outcomes.pop(0)
+        return [] if scraper.last_failure else [{"url": "u", "city": city}]
+
+    monkeypatch.setattr(scraper, "scrape_city_listings", scrape)
+
+    assert run_worker(queue, scraper, "w1", heartbeat_interval=0.01) == 1
+    assert sleeps == [42]
+    assert delays == [1]
+    assert queue.counts() == {"done": 1}
+
+
+def test_run_worker_delays_after_failed_pages(queue, monkeypatch):
+    delays = []
+    monkeypatch.setattr(job_queue, "add_delay", lambda: delays.append(1))
+    queue.enqueue(["Bad"])
+
+    run_worker(queue, FakeScraper(failing={"Bad"}), "w1", heartbeat_interval=0.01)
+
+    assert len(delays) == 2
+
+
+def test_one_failing_city_does_not_stall_the_worker(tmp_path, monkeypatch):
+    from failures import BreakerBoard, ScrapeFailure, TIMEOUT
+    from scraper import AirbnbScraper
+
+    monkeypatch.setattr(job_queue, "add_delay", lambda: None)
+    sleeps = []
+    monkeypatch.setattr(job_queue.time, "sleep", sleeps.append)
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), max_attempts=2, retry_delay=0.05)
+    queue.enqueue(["Bad"], pages=3)
+    queue.enqueue(["A", "B"])
+
+    scraper = AirbnbScraper(use_selenium=False)
+    scraper.breakers = BreakerBoard(failure_threshold=3, cooldown=0.05)
+    calls = []
+
+    def scrape(url, city, callback=None, page=0):
+        calls.append(city)
+        if city == "Bad":
+            raise ScrapeFailure(TIMEOUT, "timed out")
+        return [{"url": f"https://www.airbnb.com/rooms/{len(calls)}", "city": city}]
+
+    monkeypatch.setattr(scraper, "_scrape_with_requests", scrape)
+
+    completed = run_worker(queue, scraper, "w1", heartbeat_interval=0.01)
+
+    assert completed == 2
+    assert calls[:5] == ["Bad", "Bad", "Bad", "A", "B"]
+    assert queue.counts() == {"done": 2, "failed": 3}
+    assert scraper.breakers.get("requests").opened_at is None
+    assert not [wait for wait in sleeps if wait > 0.01]
@@ -0,0 +1,50 @@
+from postprocess import process_listings, validated_records
+
+
+def listing(room, price="£100", name="Loft", city="A"):
+    return {"name": name, "price": price, "url": f"https://www.airbnb.com/rooms/{room}", "city": city}
+
+
+def test_prices_are_parsed_and_flags_set():
+    df = process_listings([listing(1, "£1,250"), listing(2, name="Search results"), listing(3, price="N/A")])
+
+    assert df.loc[0, "price_amount"] == 1250
+    assert df.loc[0, "currency"] == "GBP"
+    assert df["issues"].tolist() == ["", "junk_name", "missing_price"]
+    assert df["is_valid"].tolist() == [True, False, False]
+
+
+def test_later_copy_of_a_room_is_a_duplicate():
+    df = process_listings([listing(1), listing(1, "£120")])
+
+    assert df["duplicate"].tolist() == [False, True]
+
+
+def test_invalid_first_copy_does_not_knock_out_a_valid_one():
+    rows, _ = validated_records([listing(1, price="N/A"), listing(1, "£120")])
+
+    assert [row["price"] for row in rows] == ["£120"]
+
+
+def test_duplicates_are_detected_across_batches():
+    seen = set()
+    first, _ = validated_records([listing(1), listing(2, price="N/A")], seen_room_ids=seen)
+    second, _ = validated_records([listing(1, "£90"), listing(2, "£80")], seen_room_ids=seen)
+
+    assert seen == {"1", "2"}
+    assert [row["room_id"] for row in first] == ["1"]
+    assert [row["room_id"] for row in second] == ["2"]
+
+
+def test_stats_count_issues_per_city():
+    _, stats = validated_records([listing(1), listing(2, city="B"), listing(2, city="B")])
+
+    assert stats.set_index("city")["duplicate"].to_dict() == {"A": 0, "B": 1}
+    assert stats.set_index("city")["valid_ratio"].to_dict() == {"A": 1.0, "B": 0.5}
+
+
+def test_empty_batch():
+    rows, stats = validated_records([])
+
+    assert rows == []
+    assert stats.empty
@@ -0,0 +1,76 @@
+import pytest
+
+from config import CITY_FRESHNESS_SLA_HOURS, DEFAULT_CITY_COST_SECONDS
+from scheduler import CityScheduler, median_price
+
+HOUR = 3600
+NOW = 1_700_000_000
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    return CityScheduler(str(tmp_path / "schedule.json"))
+
+
+def test_median_price_uses_the_price_parser():
+    assert median_price([{"price": "£1,200"}, {"price": "£100"}, {"price": "N/A"}, {"price": "$300"}]) == 300
+    assert median_price([{"price": "N/A"}]) is None
+
+
+def test_never_attempted_city_is_always_due(scheduler):
+    assert scheduler.staleness("New", NOW) == float("inf")
+
+
+def test_staleness_counts_from_last_success(scheduler):
+    scheduler.record("A", [{"price": "£100"}], 10, True, now=NOW)
+
+    assert scheduler.staleness("A", NOW + CITY_FRESHNESS_SLA_HOURS * HOUR / 2) == pytest.approx(0.5)
+
+
+def test_failing_city_ages_from_first_attempt(scheduler):
+    scheduler.record("Bad", [], 10, False, now=NOW)
+    scheduler.record("Bad", [], 10, False, now=NOW + HOUR)
+
+    assert scheduler.staleness("Bad", NOW + CITY_FRESHNESS_SLA_HOURS * HOUR) == pytest.approx(1)
+
+
+def test_empty_successful_scrape_is_not_a_failure(scheduler):
+    scheduler.record("Quiet", [], 10, True, now=NOW)
+
+    assert scheduler.cities["Quiet"]["failures"] == 0
+    assert scheduler.staleness("Quiet", NOW) == 0
+
+
+def test_expected_cost_grows_with_failures(scheduler):
+    assert scheduler.expected_cost("New") == DEFAULT_CITY_COST_SECONDS
+    scheduler.record("Good", [{"price": "£1"}], 10, True, now=NOW)
+    scheduler.record("Bad", [], 10, False, now=NOW)
+
+    assert scheduler.expected_cost("Good") == pytest.approx(10)
+    assert scheduler.expected_cost("Bad") == pytest.approx(20)
+
+
+def test_build_queue_orders_by_staleness_per_cost(scheduler):
+    later = NOW + 3 * CITY_FRESHNESS_SLA_HOURS * HOUR
+    scheduler.record("Good", [{"price": "£1"}], 10, True, now=NOW)
+    scheduler.record("Bad", [], 10, False, now=NOW)
+    scheduler.record("Fresh", [{"price": "£1"}], 10, True, now=later)
+
+    assert scheduler.build_queue(["Bad", "Good", "Fresh", "New"], now=later) == ["New", "Good", "Bad"]
+    assert "Fresh" in scheduler.build_queue(["Fresh"], include_fresh=True, now=later)
+
+
+def test_build_queue_applies_the_budget_to_every_city(scheduler):
+    scheduler.record("A", [{"price": "£1"}], 10, True, now=NOW)
+    scheduler.record("B", [{"price": "£1"}], 10, True, now=NOW)
+    later = NOW + 2 * CITY_FRESHNESS_SLA_HOURS * HOUR
+
+    assert scheduler.build_queue(["A", "B"], time_budget=15, now=later) == ["A"]
+    assert scheduler.build_queue(["A", "B"], time_budget=5, now=later) == []
+
+
+def test_state_survives_a_reload(scheduler):
+    scheduler.record("A", [{"price": "£100"}], 10, True, now=NOW)
+    scheduler.save()
+
+    assert CityScheduler(scheduler.state_path).cities == scheduler.cities
@@ -0,0 +1,44 @@
+from scraper import extract_listings_from_html
+
+CARD = """
+<div data-testid="card-container">
+  <a href="/rooms/42"></a>
+  <div data-testid="listing-card-title">Flat in Austin</div>
+  <div data-testid="listing-card-name">Sunny loft</div>
+  <div class="_w3xh25">{prices}</div>
+</div>
+"""
+
+DISCOUNTED = """
+<div aria-hidden="true"><s>£120</s> <span>£100</span> night</div>
+<span class="sr-only">£100 per night, originally £120</span>
+"""
+
+SINGLE = """
+<div aria-hidden="true"><span>£100</span> night</div>
+<span class="sr-only">£100 per night</span>
+"""
+
+
+def extract(prices):
+    return extract_listings_from_html(CARD.format(prices=prices), "Austin", "selenium")
+
+
+def test_discounted_price_keeps_original_and_current():
+    [listing] = extract(DISCOUNTED)
+
+    assert (listing["price"], listing["original_price"]) == ("£100", "£120")
+    assert listing["name"] == "Flat in Austin — Sunny loft"
+    assert listing["url"] == "https://www.airbnb.com/rooms/42"
+
+
+def test_single_price_has_no_original():
+    [listing] = extract(SINGLE)
+
+    assert (listing["price"], listing["original_price"]) == ("£100", "N/A")
+
+
+def test_text_hidden_from_the_page_is_ignored():
+    [listing] = extract('<span style="display: none">£999</span>' + SINGLE)
+
+    assert (listing["price"], listing["original_price"]) == ("£100", "N/A")
@@ -0,0 +1,25 @@
+import pandas as pd
+
+from utils import ListingWriter
+
+
+def test_listing_writer_streams_batches(tmp_path):
+    path = str(tmp_path / "out.csv")
+    writer = ListingWriter(path)
+    writer.write([{"name": "A", "price": "£1"}])
+    writer.write([{"price": "£2", "name": "B"}])
+    writer.close()
+
+    assert writer.rows_written == 2
+    assert writer.files == [path]
+    assert pd.read_csv(path).to_dict("records") == [{"name": "A", "price": "£1"}, {"name": "B", "price": "£2"}]
+
+
+def test_listing_writer_creates_files_without_rows(tmp_path):
+    csv_path, excel_path = str(tmp_path / "out.csv"), str(tmp_path / "out.xlsx")
+    writer = ListingWriter(csv_path, excel_path)
+    writer.write([])
+    writer.close()
+
+    assert writer.rows_written == 0
+    assert writer.files == [csv_path, excel_path]
@@ -6,20 +6,33 @@ import time
 import random
 import os
 import re
+import json
 import pandas as pd
-from typing import List, Dict
+from typing import List, Dict, Iterable, Optional
 import requests
-from config import REQUEST_DELAY, PROXY_LIST, USE_PROXIES
+from config import REQUEST_DELAY, PROXY_LIST, USE_PROXIES, SEARCH_PAGE_SIZE
 
 def create_output_folder():
     """Create output folder if it doesn't exist"""
     if not os.path.exists("output"):
         os.makedirs("output")
 
-def get_random_proxy():
-    """Get a random proxy from the proxy list"""
+def write_json_atomic(path: str, data, indent: Optional[int] = None):
+    """Write JSON through a temporary file so a crash never leaves a half-written file"""
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def get_random_proxy(exclude: Optional[Iterable[str]] = None):
+    """Get a random proxy from the proxy list, skipping any in exclude"""
     if USE_PROXIES and PROXY_LIST:
-        return random.choice(PROXY_LIST)
+        candidates = [proxy for proxy in PROXY_LIST if proxy not in set(exclude or [])]
+        if candidates:
+            return random.choice(candidates)
     return None
 
 def add_delay():
@@ -70,6 +83,59 @@ def save_to_excel(data: List[Dict], filename: str):
     df.to_excel(filepath, index=False, engine='openpyxl')
     print(f"Data saved to {filepath}")
 
+class ListingWriter:
+    """Streams batches of listings to CSV and/or Excel without holding them all in memory
+
+    The columns are taken from the first non-empty batch. After ``close()``,
+    ``files`` lists the paths that were written.
+    """
+
+    def __init__(self, csv_path: Optional[str] = None, excel_path: Optional[str] = None):
+        self.csv_path = csv_path
+        self.excel_path = excel_path
+        self.columns = None
+        self.rows_written = 0
+        self.files: List[str] = []
+        self._workbook = None
+        self._sheet = None
+        if excel_path:
+            from openpyxl import Workbook
+
+            self._workbook = Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet()
+
+    def write(self, rows: List[Dict]):
+        if not rows:
+            return
+        df = pd.DataFrame(rows)
+        first = self.columns is None
+        if first:
+            self.columns = list(df.columns)
+        df = df.reindex(columns=self.columns)
+
+        if self.csv_path:
+            df.to_csv(self.csv_path, mode="w" if first else "a", header=first, index=False, encoding='utf-8')
+        if self._sheet is not None:
+            if first:
+                self._sheet.append(self.columns)
+            for values in df.astype(object).where(df.notna(), None).itertuples(index=False):
+                self._sheet.append(list(values))
+        self.rows_written += len(df)
+
+    def close(self):
+        """Finish the files; with no rows written they are created empty"""
+        self.files = []
+        if self.csv_path:
+            if self.columns is None:
+                open(self.csv_path, "w", encoding='utf-8').close()
+            if os.path.exists(self.csv_path):
+                self.files.append(self.csv_path)
+        if self._workbook is not None:
+            if self.columns is None:
+                self._sheet.append([])
+            self._workbook.save(self.excel_path)
+            self.files.append(self.excel_path)
+
 def validate_url(url: str) -> bool:
     """Validate if URL is accessible"""
     try:
@@ -78,12 +144,23 @@ def validate_url(url: str) -> bool:
     except:
         return False
 
+# Airbnb room ID inside a listing URL, e.g. /rooms/12345 or /rooms/plus/12345
+ROOM_ID_PATTERN = r"/rooms/(?:plus/)?(\d+)"
+
+def extract_room_id(url: str) -> Optional[str]:
+    """Get the Airbnb room ID from a listing URL, or None if it has none"""
+    match = re.search(ROOM_ID_PATTERN, url or "")
+    return match.group(1) if match else None
+
 def format_city_for_url(city: str) -> str:
     """Format city name for Airbnb URL"""
     return city.replace(" ", "-").replace(",", "--")
 
-def generate_airbnb_search_url(city: str) -> str:
-    """Generate Airbnb search URL for a given city"""
+def generate_airbnb_search_url(city: str, page: int = 0) -> str:
+    """Generate Airbnb search URL for a given city and results page"""
     formatted_city = format_city_for_url(city)
     base_url = "https://www.airbnb.com/s"
-    return f"{base_url}/{formatted_city}/homes"
+    url = f"{base_url}/{formatted_city}/homes"
+    if page > 0:
+        url += f"?items_offset={page * SEARCH_PAGE_SIZE}"
+    return url